@@ -0,0 +1,339 @@
+"""dockery against the fake Docker Engine API of fake_docker.py, no daemon needed.
+
+Starts the fake server on a temporary unix socket and measures:
+
+    cli       wall time of the subcommands
+    tui       time until the containers list is on screen, threads and streams
+    refresh   time and API requests of a resync of the containers list
+    logs      `dockery logs` throughput, single and merged
+    export    the checks of export_check.py: `logs --export` run twice and
+              after a kill -9, no line lost or exported twice
+
+The threads, streams and files left after using the interface are checked by
+tests/test_leaks.py.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py cli logs --containers 500 --latency 0.002
+    python benchmarks/bench.py --save before.json
+    python benchmarks/bench.py --baseline before.json --tolerance 0.2
+
+With --baseline, exits with 1 if a time got slower (or a throughput lower)
+than the baseline by more than --tolerance, or if a check failed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.client import HTTPConnection
+from pathlib import Path
+from typing import Callable, Optional
+
+from export_check import dockery, run_checks
+
+HERE = Path(__file__).parent
+# The interface captures what is printed while it runs
+OUT = sys.__stdout__
+BENCHMARKS = ("cli", "tui", "refresh", "logs", "export")
+# Units compared with the baseline, True if higher is better
+COMPARED = {
+    "ms": False,
+    "requests": False,
+    "threads": False,
+    "streams": False,
+    "lines/s": True,
+    "MB/s": True,
+}
+
+
+class Results:
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.failed: list[str] = []
+
+    def add(self, benchmark: str, metric: str, value: float, unit: str) -> None:
+        row = {"benchmark": benchmark, "metric": metric, "value": value, "unit": unit}
+        self.rows.append(row)
+        print(f"{benchmark:<9}{metric:<34}{value:>12.1f} {unit}", file=OUT, flush=True)
+
+    def check(self, benchmark: str, name: str, ok: bool, detail: str = "") -> None:
+        print(
+            f"{benchmark:<9}{name:<34}{'ok' if ok else 'FAILED':>12} {detail}", file=OUT
+        )
+        if not ok:
+            self.failed.append(f"{benchmark} {name}")
+
+    def compare(self, baseline: list[dict], tolerance: float) -> list[str]:
+        before = {(r["benchmark"], r["metric"]): r for r in baseline}
+        regressions = []
+        for row in self.rows:
+            old = before.get((row["benchmark"], row["metric"]))
+            unit = row["unit"]
+            if old is None or unit not in COMPARED or not old["value"]:
+                continue
+            change = row["value"] / old["value"] - 1
+            if COMPARED[unit]:
+                change = -change
+            if change > tolerance:
+                regressions.append(
+                    f"{row['benchmark']} {row['metric']}: "
+                    f"{old['value']:.1f} -> {row['value']:.1f} {row['unit']}"
+                )
+        return regressions
+
+
+class FakeDaemon:
+    """fake_docker.py in its own process, so it doesn't compete for the GIL."""
+
+    def __init__(self, directory: str, **options):
+        self.path = os.path.join(directory, "docker.sock")
+        self.url = "unix://" + self.path
+        args = [sys.executable, str(HERE / "fake_docker.py"), self.path]
+        for name, value in options.items():
+            args += [f"--{name.replace('_', '-')}", str(value)]
+        self.process = subprocess.Popen(args)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.path):
+            if time.monotonic() > deadline or self.process.poll() is not None:
+                raise RuntimeError("The fake daemon didn't start")
+            time.sleep(0.05)
+
+    def request(self, method: str, path: str) -> Optional[dict]:
+        connection = UnixHTTPConnection(self.path)
+        connection.request(method, path)
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return json.loads(body) if body else None
+
+    def stats(self) -> dict:
+        return self.request("GET", "/_fake/stats")  # type: ignore
+
+    def reset(self) -> None:
+        self.request("POST", "/_fake/reset")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def wall_time(command: list[str], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def bench_cli(daemon: FakeDaemon, options, results: Results) -> None:
+    server = ["--server", daemon.url]
+    commands = {
+        "ps": ["ps"],
+        "ps -a": ["ps", "-a"],
+        "ps --inspect": ["ps", "--inspect"],
+        "ps --filter": ["ps", "--filter", "name=container1"],
+        "ps --quiet": ["ps", "--quiet"],
+        "images": ["images"],
+        "volumes": ["volumes"],
+        "networks": ["networks"],
+        "df": ["df"],
+        "stats": ["stats"],
+        "top": ["top", "--interval", "0.5", "--api-version", "1.41"],
+        # Streams instead of one-shot requests
+        "top api 1.35": ["top", "--interval", "0.5", "--api-version", "1.35"],
+        "logs --tail 100": ["logs", "container0", "--tail", "100"],
+    }
+    for name, args in commands.items():
+        daemon.reset()
+        ms = wall_time(dockery(*args, *server, "-f", "ndjson"), options.repeat)
+        requests = sum(daemon.stats()["requests"].values()) / options.repeat
+        results.add("cli", f"{name} time", ms, "ms")
+        results.add("cli", f"{name} requests", requests, "requests")
+
+
+def run_app(daemon: FakeDaemon, test: Callable) -> None:
+    """Runs test(app, pilot) in a headless interface connected to the daemon."""
+    from dockery.gui import AppGUI
+    from dockery.hosts import connect
+
+    hosts = connect((daemon.url,), None, False, "1.41", None)
+
+    async def main():
+        app = AppGUI(hosts, snapshot=False)
+        async with app.run_test(size=(160, 50)) as pilot:
+            await test(app, pilot)
+
+    asyncio.run(main())
+
+
+async def wait_for(pilot, condition: Callable[[], bool], timeout: float = 60) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await pilot.pause(0.01)
+    return True
+
+
+def bench_tui(daemon: FakeDaemon, options, results: Results) -> None:
+    # Imported before the clock starts, benchmarks/startup.py measures this
+    import dockery.gui  # noqa: F401
+    from dockery.containers import ContainersList, ContainerWidget
+
+    start = time.perf_counter()
+
+    async def test(app, pilot):
+        containers = app.query_one(ContainersList)
+        ok = await wait_for(pilot, lambda: len(containers.query(ContainerWidget)) > 0)
+        results.check("tui", "containers shown", ok)
+        results.add("tui", "first render", (time.perf_counter() - start) * 1000, "ms")
+        await wait_for(pilot, lambda: containers.container_count == options.containers)
+        results.add("tui", "all containers", (time.perf_counter() - start) * 1000, "ms")
+        results.add("tui", "widgets mounted", len(containers.widgets), "widgets")
+        await pilot.pause(2)
+        results.add("tui", "threads", threading.active_count(), "threads")
+        results.add("tui", "open streams", daemon.stats()["open_streams"], "streams")
+
+    run_app(daemon, test)
+
+
+def bench_refresh(daemon: FakeDaemon, options, results: Results) -> None:
+    from dockery.containers import ContainersList
+    from dockery.images import ImagesList
+
+    async def test(app, pilot):
+        await pilot.pause(1)
+        host = app.hosts[0]
+        for name, widget, fetch in (
+            ("containers", app.query_one(ContainersList), "get_containers"),
+            ("images", app.query_one(ImagesList), "get_images"),
+        ):
+            times = []
+            daemon.reset()
+            for _ in range(options.repeat):
+                start = time.perf_counter()
+                await asyncio.wrap_future(getattr(widget, fetch)(host))
+                times.append(time.perf_counter() - start)
+            requests = daemon.stats()["requests"]
+            total = sum(n for k, n in requests.items() if "/events" not in k)
+            ms = statistics.median(times) * 1000
+            results.add("refresh", f"{name} time", ms, "ms")
+            results.add(
+                "refresh", f"{name} requests", total / options.repeat, "requests"
+            )
+
+    run_app(daemon, test)
+
+
+def read_output(command: list[str]) -> tuple[float, int, int]:
+    """Seconds, lines and bytes written to stdout by the command."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    lines = size = 0
+    while True:
+        block = process.stdout.read(1 << 16)  # type: ignore
+        if not block:
+            break
+        lines += block.count(b"\n")
+        size += len(block)
+    process.wait()
+    return time.perf_counter() - start, lines, size
+
+
+def bench_logs(daemon: FakeDaemon, options, results: Results) -> None:
+    server = ["--server", daemon.url]
+    for name, args in (
+        ("logs", ["container0"]),
+        ("logs --timestamps", ["container0", "--timestamps"]),
+        ("logs merged x3", ["container0", "container1", "container2"]),
+    ):
+        seconds, lines, size = read_output(dockery("logs", *args, *server))
+        results.add("logs", f"{name} lines", lines, "lines")
+        results.add("logs", f"{name} throughput", lines / seconds, "lines/s")
+        results.add("logs", f"{name} bytes", size / seconds / 1e6, "MB/s")
+
+
+def bench_export(daemon: FakeDaemon, options, results: Results) -> None:
+    run_checks(
+        daemon.url,
+        lambda metric, value, unit: results.add("export", metric, value, unit),
+        lambda name, ok, detail: results.check("export", name, ok, detail),
+    )
+
+
+RUNNERS = {
+    "cli": bench_cli,
+    "tui": bench_tui,
+    "refresh": bench_refresh,
+    "logs": bench_logs,
+    "export": bench_export,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS))
+    parser.add_argument("--containers", type=int, default=200)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--log-lines", type=int, default=200000, help="Log lines of each container"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="Write the results to this json file")
+    parser.add_argument("--baseline", help="Compare with the results of --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    options = parser.parse_args()
+
+    results = Results()
+    directory = tempfile.mkdtemp(prefix="dockery-bench-")
+    daemon = FakeDaemon(
+        directory,
+        containers=options.containers,
+        images=options.images,
+        latency=options.latency,
+        stats_interval=0.1,
+        log_rate=50,
+        log_history=options.log_lines,
+    )
+    try:
+        for name in options.benchmarks:
+            RUNNERS[name](daemon, options, results)
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if options.save:
+        with open(options.save, "w") as file:
+            json.dump(results.rows, file, indent=2)
+    problems = list(results.failed)
+    if options.baseline:
+        with open(options.baseline) as file:
+            problems += results.compare(json.load(file), options.tolerance)
+    for problem in problems:
+        print(f"Regression: {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""`dockery logs --export` against fake_docker.py: no line lost or exported twice.
+
+Exports the logs of a container three times: a first run, a resumed run that
+must only add the lines written since, and a run killed with kill -9 that the
+next run must redo. Every line must be exported once and in order.
+
+    python benchmarks/export_check.py
+    python benchmarks/export_check.py --log-lines 1000000
+
+Exits with 1 if a check failed.
+"""
+
+import argparse
+import gzip
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from fake_docker import FakeDocker, serve
+
+Measure = Callable[[str, float, str], None]
+Check = Callable[[str, bool, str], None]
+
+
+def dockery(*args: str) -> list[str]:
+    return [sys.executable, "-m", "dockery.main", *args]
+
+
+def exported_lines(folder: Path) -> list[int]:
+    numbers = []
+    for path in sorted(folder.glob("*.log.gz")):
+        with gzip.open(path, "rt") as file:
+            numbers += [int(m) for m in re.findall(r" line (\d+)$", file.read(), re.M)]
+    return numbers
+
+
+def check_folder(
+    check: Check, name: str, folder: Path, first_run: int, detail: str = ""
+) -> None:
+    # Every line from the first one, once and in order
+    numbers = exported_lines(folder)
+    expected = list(range(numbers[-1] + 1)) if numbers else []
+    ok = numbers == expected and len(numbers) >= first_run
+    check(name, ok, f"{len(numbers)} lines {detail}")
+    check(f"{name} no .part left", not list(folder.glob("*.part")), "")
+
+
+def run_checks(url: str, measure: Measure, check: Check) -> None:
+    """Exports container0 of the fake daemon at url three times."""
+    directory = Path(tempfile.mkdtemp(prefix="dockery-export-"))
+    folder = directory / "container0"
+    command = dockery("logs", "container0", "--export", str(directory))
+    command += ["--server", url]
+    try:
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - start
+        first_run = len(exported_lines(folder))
+        measure("first run", seconds * 1000, "ms")
+        measure("first run throughput", first_run / seconds, "lines/s")
+        check_folder(check, "first run", folder, first_run)
+        # New lines arrive at the log rate, the next run must only get those
+        time.sleep(1)
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        measure("resumed run", (time.perf_counter() - start) * 1000, "ms")
+        check_folder(check, "resumed", folder, first_run)
+        # Killed mid-export, the next run must redo it
+        time.sleep(1)
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+        process.send_signal(signal.SIGKILL)
+        killed = process.wait() == -signal.SIGKILL
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        detail = "killed mid-export" if killed else "done before the kill"
+        check_folder(check, "after kill -9", folder, first_run, detail)
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--log-lines", type=int, default=200000, help="Log lines of the container"
+    )
+    options = parser.parse_args()
+
+    failed = []
+
+    def measure(metric: str, value: float, unit: str) -> None:
+        print(f"{metric:<34}{value:>12.1f} {unit}", flush=True)
+
+    def check(name: str, ok: bool, detail: str) -> None:
+        print(f"{name:<34}{'ok' if ok else 'FAILED':>12} {detail}", flush=True)
+        if not ok:
+            failed.append(name)
+
+    directory = tempfile.mkdtemp(prefix="dockery-export-check-")
+    path = os.path.join(directory, "docker.sock")
+    server = serve(path, FakeDocker(1, log_rate=50, log_history=options.log_lines))
+    try:
+        run_checks("unix://" + path, measure, check)
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
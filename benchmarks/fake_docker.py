@@ -0,0 +1,568 @@
+"""Fake Docker Engine API server listening on a unix socket.
+
+Serves a configurable number of containers, images, networks and volumes,
+streams synthetic stats, logs and events, and can add latency to every
+request. Good enough for dockery, not a full Engine API.
+
+    python benchmarks/fake_docker.py /tmp/fake.sock --containers 500
+    dockery --server unix:///tmp/fake.sock
+
+The log of each container is a fixed timeline: line n has the same text and
+timestamp in every request, the first --log-history lines are already there
+at start and the next ones appear at --log-rate lines per second, so resumed
+log exports can be checked for gaps and duplicates.
+
+`GET /_fake/stats` returns the requests received by route and the open
+streams, and `POST /_fake/reset` clears the request counters.
+"""
+
+import argparse
+import json
+import os
+import re
+import socketserver
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_VERSION = "1.41"
+TRUE = ("1", "true", "True")
+
+
+CONTAINER_FILTERS = ("id", "name", "status", "label")
+
+
+def parse_filters(value: Optional[str]) -> dict[str, list[str]]:
+    # {"status": ["running"]}, or {"status": {"running": true}} in old clients
+    filters = json.loads(value) if value else {}
+    return {k: list(v) for k, v in filters.items()}
+
+
+def container_matches(c: dict, filters: dict[str, list[str]]) -> bool:
+    """Supports the id, name, status and label filters, values of the same
+    filter are alternatives and different filters must all match."""
+    labels = c["Config"]["Labels"]
+    tests = {
+        "id": lambda v: c["Id"].startswith(v),
+        "name": lambda v: v in c["Name"],
+        "status": lambda v: c["State"]["Status"] == v,
+        "label": lambda v: (
+            labels.get(v.partition("=")[0]) == v.partition("=")[2]
+            if "=" in v
+            else v in labels
+        ),
+    }
+    return all(any(tests[k](v) for v in values) for k, values in filters.items())
+
+
+def container_id(index: int) -> str:
+    return f"{index:064x}"
+
+
+def parse_since(value: Optional[str]) -> Optional[int]:
+    # Unix time in the API format, seconds with up to 9 decimals, in ns
+    if not value:
+        return None
+    seconds, _, fraction = value.partition(".")
+    return int(seconds) * 10**9 + int((fraction + "0" * 9)[:9])
+
+
+class FakeDocker:
+    def __init__(
+        self,
+        containers: int = 10,
+        images: int = 5,
+        networks: int = 3,
+        volumes: int = 3,
+        latency: float = 0.0,
+        stats_interval: float = 1.0,
+        stats_samples: int = 0,
+        log_rate: float = 10.0,
+        log_history: int = 3600,
+        event_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.stats_interval = stats_interval
+        # Samples sent before a stats stream ends, 0 for never
+        self.stats_samples = stats_samples
+        self.started = time.time()
+        self.log_rate = log_rate
+        self.log_history = log_history
+        # Timestamp of the first line, so log_history lines exist at start
+        self.log_step_ns = int(10**9 / log_rate)
+        self.log_origin_ns = time.time_ns() - log_history * self.log_step_ns
+        self.lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+        self.open_streams = 0
+        self.events: list[dict] = []
+        self.events_cond = threading.Condition(self.lock)
+        self.images = {
+            f"sha256:{i:064x}": self.image(f"sha256:{i:064x}", i) for i in range(images)
+        }
+        image_ids = list(self.images) or ["sha256:" + "0" * 64]
+        self.containers: dict[str, dict] = {}
+        for i in range(containers):
+            self.add_container(i, image_ids[i % len(image_ids)])
+        self.networks = {
+            f"{i:064x}": {
+                "Id": f"{i:064x}",
+                "Name": f"network{i}",
+                "Scope": "local",
+                "Driver": "bridge",
+                "Containers": {},
+            }
+            for i in range(networks)
+        }
+        self.volumes = {
+            f"volume{i}": {
+                "Name": f"volume{i}",
+                "Driver": "local",
+                "Mountpoint": f"/var/lib/docker/volumes/volume{i}/_data",
+                "Scope": "local",
+            }
+            for i in range(volumes)
+        }
+        if event_rate > 0:
+            threading.Thread(
+                target=self.emit_updates, args=(event_rate,), daemon=True
+            ).start()
+
+    def image(self, image_id: str, index: int) -> dict:
+        return {
+            "Id": image_id,
+            "RepoTags": [f"image{index}:latest"],
+            "Size": 1000000 * (index + 1),
+            "Created": 0,
+            "Labels": {},
+        }
+
+    def add_container(self, index: int, image_id: str, status: str = "running"):
+        cid = container_id(index)
+        self.containers[cid] = {
+            "Id": cid,
+            "Name": f"/container{index}",
+            "Image": image_id,
+            "Created": "2023-01-01T00:00:00Z",
+            "State": {"Status": status, "Running": status == "running"},
+            "Config": {
+                "Tty": False,
+                "Image": image_id,
+                "Labels": {"com.docker.compose.project": f"project{index % 3}"},
+            },
+            "NetworkSettings": {"Networks": {"bridge": {"NetworkID": "0" * 64}}},
+            "Mounts": [{"Type": "volume", "Name": f"volume{index % 2}"}],
+        }
+        return cid
+
+    def emit(self, event: dict) -> None:
+        with self.events_cond:
+            event.setdefault("time", int(time.time()))
+            event.setdefault("timeNano", time.time_ns())
+            self.events.append(event)
+            self.events_cond.notify_all()
+
+    def emit_updates(self, rate: float) -> None:
+        # "update" events of the containers in turn, each one makes the
+        # clients inspect the container again
+        ids = list(self.containers)
+        number = 0
+        while ids:
+            time.sleep(1 / rate)
+            cid = ids[number % len(ids)]
+            self.emit(
+                {
+                    "Type": "container",
+                    "Action": "update",
+                    "Actor": {"ID": cid, "Attributes": {}},
+                }
+            )
+            number += 1
+
+    def sparse(self, c: dict) -> dict:
+        return {
+            "Id": c["Id"],
+            "Names": [c["Name"]],
+            "Image": c["Config"]["Image"],
+            "ImageID": c["Image"],
+            "State": c["State"]["Status"],
+            "Status": c["State"]["Status"],
+            "Labels": c["Config"]["Labels"],
+        }
+
+    def stats(self, index: int, tick: int) -> dict:
+        cpu = (tick + 1) * 1000000 * (index % 4 + 1)
+        system = (tick + 1) * 100000000
+        prev_cpu = tick * 1000000 * (index % 4 + 1)
+        prev_system = tick * 100000000
+        io = (tick + 1) * 4096 * (index + 1)
+        return {
+            "read": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime()),
+            "cpu_stats": {
+                "cpu_usage": {"total_usage": cpu},
+                "system_cpu_usage": system,
+                "online_cpus": 4,
+            },
+            "precpu_stats": {
+                "cpu_usage": {"total_usage": prev_cpu},
+                "system_cpu_usage": prev_system,
+            },
+            "memory_stats": {
+                "usage": 50000000 + index * 1000000,
+                "limit": 8000000000,
+                "stats": {"active_file": 1000000, "cache": 2000000},
+            },
+            "networks": {"eth0": {"rx_bytes": io, "tx_bytes": io // 2}},
+            "blkio_stats": {
+                "io_service_bytes_recursive": [
+                    {"op": "read", "value": io * 2},
+                    {"op": "write", "value": io},
+                ]
+            },
+        }
+
+    def log_line_ns(self, number: int) -> int:
+        return self.log_origin_ns + number * self.log_step_ns
+
+    def log_lines(
+        self, since_ns: Optional[int], until_ns: Optional[int], tail: Optional[int]
+    ) -> range:
+        """Numbers of the lines written so far in [since, until]."""
+        last = (time.time_ns() - self.log_origin_ns) // self.log_step_ns
+        if until_ns is not None:
+            last = min(last, (until_ns - self.log_origin_ns) // self.log_step_ns)
+        first = 0
+        if since_ns is not None:
+            # since is inclusive, like the real API
+            first = max(0, -(-(since_ns - self.log_origin_ns) // self.log_step_ns))
+        if tail is not None:
+            first = max(first, last + 1 - tail)
+        return range(first, last + 1)
+
+    def requests_stats(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.requests), "open_streams": self.open_streams}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self) -> FakeDocker:
+        return self.server.fake
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def no_content(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def not_found(self):
+        self.send_json({"message": "not found"}, 404)
+
+    def start_stream(self, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        url = urlparse(self.path)
+        path = re.sub(r"^/v[\d.]+", "", url.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if path == "/_fake/stats":
+            return self.send_json(self.fake.requests_stats())
+        if path == "/_fake/reset":
+            with self.fake.lock:
+                self.fake.requests.clear()
+            return self.no_content()
+        with self.fake.lock:
+            key = re.sub(r"/[0-9a-f]{12,64}|/volume\d+|/container\d+", "/{id}", path)
+            key = f"{method} {key}"
+            self.fake.requests[key] = self.fake.requests.get(key, 0) + 1
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if path == "/_ping":
+            return self.send_json("OK")
+        if path == "/version":
+            return self.send_json({"ApiVersion": API_VERSION, "Version": "fake"})
+        if path == "/events":
+            return self.events()
+        if path == "/containers/json":
+            filters = parse_filters(query.get("filters"))
+            for name in set(filters) - set(CONTAINER_FILTERS):
+                return self.send_json({"message": f"invalid filter '{name}'"}, 400)
+            # A status filter also lists the stopped containers, like dockerd
+            running_only = query.get("all") not in TRUE and "status" not in filters
+            items = [
+                self.fake.sparse(c)
+                for c in self.fake.containers.values()
+                if (not running_only or c["State"]["Running"])
+                and container_matches(c, filters)
+            ]
+            return self.send_json(items)
+        m = re.match(r"^/containers/([^/]+)(/\w+)?$", path)
+        if m:
+            c = self.find_container(m.group(1))
+            if c is None:
+                return self.not_found()
+            action = m.group(2)
+            if action in (None, "/json"):
+                return self.send_json(c)
+            if action == "/stats":
+                return self.container_stats(c, query)
+            if action == "/logs":
+                return self.container_logs(c, query)
+            if action in ("/start", "/stop", "/restart"):
+                running = action != "/stop"
+                c["State"] = {
+                    "Status": "running" if running else "exited",
+                    "Running": running,
+                }
+                status = {"/start": "start", "/stop": "die", "/restart": "restart"}
+                self.fake.emit(
+                    {
+                        "Type": "container",
+                        "Action": status[action],
+                        "Actor": {"ID": c["Id"], "Attributes": {}},
+                    }
+                )
+                return self.no_content()
+        if path == "/images/json":
+            items = [
+                dict(i, ParentId="", RepoDigests=[], SharedSize=0, Containers=0)
+                for i in self.fake.images.values()
+            ]
+            return self.send_json(items)
+        m = re.match(r"^/images/(.+)/json$", path)
+        if m:
+            ref = m.group(1)
+            image = self.fake.images.get(ref) or self.fake.images.get("sha256:" + ref)
+            return self.send_json(image) if image else self.not_found()
+        if path == "/networks":
+            return self.send_json(list(self.fake.networks.values()))
+        m = re.match(r"^/networks/([^/]+)$", path)
+        if m:
+            network = self.fake.networks.get(m.group(1))
+            return self.send_json(network) if network else self.not_found()
+        if path == "/volumes":
+            return self.send_json(
+                {"Volumes": list(self.fake.volumes.values()), "Warnings": []}
+            )
+        m = re.match(r"^/volumes/([^/]+)$", path)
+        if m:
+            volume = self.fake.volumes.get(m.group(1))
+            return self.send_json(volume) if volume else self.not_found()
+        if path == "/system/df":
+            return self.send_json(
+                {
+                    "Images": list(self.fake.images.values()),
+                    "Containers": list(self.fake.containers.values()),
+                    "Volumes": list(self.fake.volumes.values()),
+                }
+            )
+        return self.not_found()
+
+    def find_container(self, ref):
+        containers = self.fake.containers
+        if ref in containers:
+            return containers[ref]
+        for c in containers.values():
+            if c["Id"].startswith(ref) or c["Name"] == "/" + ref:
+                return c
+        return None
+
+    def stream(self, chunks: Iterator[bytes]):
+        with self.fake.lock:
+            self.fake.open_streams += 1
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                else:
+                    # Keep alive, also detects closed clients
+                    self.wfile.write(b"")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            with self.fake.lock:
+                self.fake.open_streams -= 1
+
+    def container_stats(self, c, query):
+        index = int(c["Id"], 16)
+        if query.get("stream") in ("0", "false", "False"):
+            # Counters grow with time, so two one-shot samples give rates
+            tick = int((time.time() - self.fake.started) / self.fake.stats_interval)
+            if query.get("one-shot") not in TRUE:
+                time.sleep(self.fake.stats_interval)
+            return self.send_json(self.fake.stats(index, tick))
+        self.start_stream()
+
+        def chunks():
+            tick = 0
+            while tick < self.fake.stats_samples or not self.fake.stats_samples:
+                yield (json.dumps(self.fake.stats(index, tick)) + "\n").encode()
+                tick += 1
+                time.sleep(self.fake.stats_interval)
+
+        self.stream(chunks())
+
+    def container_logs(self, c, query):
+        timestamps = query.get("timestamps") in TRUE
+        follow = query.get("follow") in TRUE
+        tail = query.get("tail", "all")
+        # 0 is no limit
+        until_ns = parse_since(query.get("until")) or None
+        lines = self.fake.log_lines(
+            parse_since(query.get("since")),
+            until_ns,
+            None if tail == "all" else int(tail),
+        )
+        name = c["Name"][1:]
+        fake = self.fake
+        seconds: dict[int, str] = {}
+
+        def line(number: int) -> bytes:
+            text = f"{name} line {number}\n"
+            if timestamps:
+                second, nanos = divmod(fake.log_line_ns(number), 10**9)
+                stamp = seconds.get(second)
+                if stamp is None:
+                    seconds.clear()
+                    stamp = seconds[second] = time.strftime(
+                        "%Y-%m-%dT%H:%M:%S", time.gmtime(second)
+                    )
+                text = f"{stamp}.{nanos:09d}Z {text}"
+            data = text.encode()
+            return struct.pack(">BxxxL", 1, len(data)) + data
+
+        self.start_stream("application/vnd.docker.raw-stream")
+
+        def chunks():
+            for start in range(lines.start, lines.stop, 512):
+                yield b"".join(
+                    line(n) for n in range(start, min(start + 512, lines.stop))
+                )
+            if not follow:
+                return
+            number = lines.stop
+            # A followed log ends at until, like with dockerd
+            while until_ns is None or fake.log_line_ns(number) <= until_ns:
+                wait = (fake.log_line_ns(number) - time.time_ns()) / 10**9
+                if wait > 0:
+                    time.sleep(wait)
+                yield line(number)
+                number += 1
+
+        self.stream(chunks())
+
+    def events(self):
+        self.start_stream()
+        with self.fake.lock:
+            position = len(self.fake.events)
+
+        def chunks():
+            nonlocal position
+            while True:
+                with self.fake.events_cond:
+                    self.fake.events_cond.wait_for(
+                        lambda: len(self.fake.events) > position, timeout=1
+                    )
+                    events = self.fake.events[position:]
+                    position = len(self.fake.events)
+                for event in events:
+                    yield (json.dumps(event) + "\n").encode()
+                if not events:
+                    yield b""
+
+        self.stream(chunks())
+
+
+class FakeServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, fake: FakeDocker):
+        self.fake = fake
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, Handler)
+
+    def handle_error(self, request, client_address):
+        # Clients closing their streams are expected, other errors are shown
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(path: str, fake: FakeDocker) -> FakeServer:
+    server = FakeServer(path, fake)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("socket")
+    parser.add_argument("--containers", type=int, default=10)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--networks", type=int, default=3)
+    parser.add_argument("--volumes", type=int, default=3)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each request"
+    )
+    parser.add_argument("--stats-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--stats-samples", type=int, default=0, help="Samples before a stream ends"
+    )
+    parser.add_argument("--log-rate", type=float, default=10.0, help="Lines/s")
+    parser.add_argument(
+        "--log-history", type=int, default=3600, help="Lines already there at start"
+    )
+    parser.add_argument(
+        "--event-rate", type=float, default=0.0, help="Update events per second"
+    )
+    options = parser.parse_args()
+    fake = FakeDocker(
+        options.containers,
+        images=options.images,
+        networks=options.networks,
+        volumes=options.volumes,
+        latency=options.latency,
+        stats_interval=options.stats_interval,
+        stats_samples=options.stats_samples,
+        log_rate=options.log_rate,
+        log_history=options.log_history,
+        event_rate=options.event_rate,
+    )
+    server = FakeServer(options.socket, fake)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
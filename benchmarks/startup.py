@@ -0,0 +1,78 @@
+"""Import cost of each dockery subcommand, measured with `python -X importtime`.
+
+The subcommands run against a socket that doesn't exist, so they fail at the
+first API call after importing everything they need and no daemon is required.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 5 --max-ms 400
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+MISSING_SERVER = "unix:///tmp/dockery-benchmark-missing.sock"
+
+SUBCOMMANDS = {
+    "gui": ["-c", "import dockery.main, dockery.gui"],
+    "df": ["-m", "dockery.main", "df"],
+    "ps": ["-m", "dockery.main", "ps"],
+    "images": ["-m", "dockery.main", "images"],
+    "volumes": ["-m", "dockery.main", "volumes"],
+    "networks": ["-m", "dockery.main", "networks"],
+    "stats": ["-m", "dockery.main", "stats"],
+    "logs": ["-m", "dockery.main", "logs", "missing"],
+    "configs": ["-m", "dockery.main", "configs"],
+    "secrets": ["-m", "dockery.main", "secrets"],
+}
+
+
+def import_time(args: list[str]) -> tuple[float, list[tuple[int, str]]]:
+    if args[0] == "-m":
+        args = args + ["--server", MISSING_SERVER]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        capture_output=True,
+        text=True,
+    )
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        total += int(self_us)
+        modules.append((int(self_us), name.strip()))
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("subcommands", nargs="*", default=list(SUBCOMMANDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=0, help="Show the slowest modules")
+    parser.add_argument(
+        "--max-ms", type=float, default=None, help="Fail above this median cost"
+    )
+    options = parser.parse_args()
+
+    failed = []
+    print(f"{'subcommand':<12}{'median ms':>10}{'min ms':>10}{'modules':>9}")
+    for name in options.subcommands:
+        runs = [import_time(SUBCOMMANDS[name]) for _ in range(options.repeat)]
+        times = [t for t, _ in runs]
+        median = statistics.median(times)
+        modules = runs[-1][1]
+        print(f"{name:<12}{median:>10.1f}{min(times):>10.1f}{len(modules):>9}")
+        for self_us, module in sorted(modules, reverse=True)[: options.top]:
+            print(f"    {self_us / 1000:>8.1f} ms  {module}")
+        if options.max_ms is not None and median > options.max_ms:
+            failed.append(name)
+    if failed:
+        print(f"Over {options.max_ms} ms: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
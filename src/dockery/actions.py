@@ -0,0 +1,63 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+from docker import errors
+from docker.models.containers import Container
+
+from .hosts import display_name
+
+ACTIONS = ("start", "stop", "restart")
+# Containers acted on at the same time, a stop can take 10 seconds each
+MAX_PARALLEL_ACTIONS = 8
+
+
+@dataclass
+class ActionResult:
+    name: str
+    action: str
+    ok: bool
+    error: Optional[str] = None
+
+
+def run_action(container: Container, action: str) -> ActionResult:
+    try:
+        getattr(container, action)()
+    except errors.DockerException as error:
+        message = getattr(error, "explanation", None) or str(error)
+        return ActionResult(display_name(container), action, False, message)
+    return ActionResult(display_name(container), action, True)
+
+
+class ActionRunner:
+    """Runs start/stop/restart in their own threads, away from the interface
+    and from the short background refreshes."""
+
+    def __init__(self, max_workers: int = MAX_PARALLEL_ACTIONS):
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="action")
+
+    def set_max_workers(self, max_workers: int) -> None:
+        self.pool.shutdown(wait=False)
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="action")
+
+    def submit(
+        self,
+        container: Container,
+        action: str,
+        done: Callable[[ActionResult], None],
+    ) -> Future:
+        """done is called from the action thread, or from this one if the
+        action already finished."""
+        future = self.pool.submit(run_action, container, action)
+        future.add_done_callback(lambda f: done(f.result()))
+        return future
+
+    def run_all(
+        self, containers: list[Container], action: str
+    ) -> Iterator[ActionResult]:
+        """Results in the order of the containers, as soon as each one is done."""
+        return self.pool.map(lambda c: run_action(c, action), containers)
+
+
+action_runner = ActionRunner()
@@ -0,0 +1,114 @@
+from array import array
+from textual.app import ComposeResult, RenderResult
+from textual.containers import Vertical
+from textual.events import Click
+from textual.screen import ModalScreen
+from textual.widgets import Label, Sparkline
+from docker.models.containers import Container
+
+from .metrics import (
+    HISTORY_SAMPLES,
+    HISTORY_STEP,
+    METRIC_NAMES,
+    METRICS,
+    RECENT_SAMPLES,
+    RECENT_STEP,
+    metrics_store,
+)
+from .models import StatsSample, store
+from .hosts import display_name, key
+from .utils import format_metric
+
+
+class HistorySparkline(Sparkline):
+    """A metric of a container over time, opens the detail view on click."""
+
+    def __init__(self, container: Container, metric: str, recent=True, **kargs):
+        self.container = container
+        self.metric = metric
+        self.recent = recent
+        super().__init__(**kargs)
+
+    def render(self) -> RenderResult:
+        return super().render() if self.data else ""
+
+    def update_history(self) -> None:
+        history = metrics_store.get(key(self.container))
+        values = history.values(self.metric, self.recent) if history else None
+        # The bars are scaled from the lowest value, a leading 0 (hidden by the
+        # max of its bucket) keeps small changes from filling the chart
+        self.data = array("f", [0.0]) + values if values else None
+
+    def on_click(self, event: Click) -> None:
+        event.stop()
+        if not isinstance(self.screen, MetricsScreen):
+            self.app.push_screen(MetricsScreen(self.container))
+
+
+class MetricsScreen(ModalScreen):
+    BINDINGS = [
+        ("escape", "app.pop_screen", "Close"),
+        ("t", "toggle_range", "Last minute/hours"),
+    ]
+
+    def __init__(self, container: Container, **kargs):
+        self.container_key = key(container)
+        self.container = store.containers.get(self.container_key, container)
+        self.recent = False
+        super().__init__(**kargs)
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="metrics"):
+            yield Label(display_name(self.container), classes="bold")
+            yield Label(id="metrics-range")
+            for metric in METRICS:
+                yield Label(id=f"{metric}-title", classes="metric-title")
+                yield HistorySparkline(self.container, metric, recent=self.recent)
+
+    def on_mount(self) -> None:
+        self.update_charts()
+        # Keep a stream open while the view is shown
+        if self.container.status == "running":
+            self.app.stats_service.subscribe(self.container, self.on_stats)
+
+    def on_unmount(self) -> None:
+        self.app.stats_service.unsubscribe(self.container.id, self.on_stats)  # type: ignore
+
+    def on_stats(self, sample: StatsSample) -> None:
+        self.app.call_from_thread(self.update_charts_if_shown)
+
+    def update_charts_if_shown(self) -> None:
+        # A sample can arrive after the screen is closed, an error here would
+        # end the stream shared with the card
+        if self.app.screen is self:
+            self.update_charts()
+
+    def action_toggle_range(self) -> None:
+        self.recent = not self.recent
+        self.update_charts()
+
+    def update_charts(self) -> None:
+        samples, step = (
+            (RECENT_SAMPLES, RECENT_STEP)
+            if self.recent
+            else (HISTORY_SAMPLES, HISTORY_STEP)
+        )
+        seconds = samples * step
+        window = (
+            f"{seconds / 60:.0f}min" if seconds < 3600 else f"{seconds / 3600:.0f}h"
+        )
+        self.query_one("#metrics-range", Label).update(
+            f"[bright_black]Last {window}, highest value every {step:.0f}s. "
+            "t: change range, esc: close"
+        )
+        history = metrics_store.get(self.container_key)
+        for chart in self.query(HistorySparkline):
+            chart.recent = self.recent
+            chart.update_history()
+            metric = chart.metric
+            title = METRIC_NAMES[metric]
+            if history is not None and chart.data:
+                now = format_metric(metric, history.latest(metric))
+                peak = format_metric(metric, max(chart.data))
+                title += f": {now} [bright_black](peak {peak})"
+            self.query_one(f"#{metric}-title", Label).update(title)
@@ -1,57 +1,232 @@
+from functools import partial
 from textual.app import ComposeResult
 from textual.widgets import Static, Label
 from textual.reactive import reactive
-from docker import DockerClient, errors
+from textual.message import Message
+from textual.events import Click
+from docker import errors
 from docker.models.containers import Container
 from textual.containers import Horizontal, Vertical
 
-from .utils import get_cpu_usage, get_mem_usage, daemon
-from .logs import LogsButton
+from .utils import background, executor
+from .events import apply_event
+from .logs import LogsButton, COMPOSE_PROJECT_LABEL
 from .custom_widgets import CustomButton, ResponsiveGrid, ReactiveString
-from .models import store
+from .models import store, StatsSample
+from .actions import ActionResult, action_runner
+from .hosts import Host, display_name, host_key, host_of, key, keyed
+from .charts import HistorySparkline
+
+# Events that can change the state shown in a ContainerWidget
+CONTAINER_ACTIONS = (
+    "create",
+    "start",
+    "die",
+    "destroy",
+    "pause",
+    "unpause",
+    "rename",
+    "update",
+)
+PENDING_TEXT = {"start": "Starting", "stop": "Stopping", "restart": "Restarting"}
+
+
+def summary_changed(container: Container, summary: dict) -> bool:
+    """True if a summary of the containers list differs from the inspected
+    container in what the interface shows."""
+    return (
+        container.status != summary["State"]
+        or container.name != (summary["Names"] or [""])[0].lstrip("/")
+        or container.attrs["Image"] != summary["ImageID"]
+        or container.labels != (summary["Labels"] or {})
+    )
+
+
+class ContainerAction(Message):
+    """Start, stop or restart requested for a container."""
+
+    def __init__(self, container: Container, action: str):
+        self.container = container
+        self.action = action
+        super().__init__()
 
 
-class ContainersList(ResponsiveGrid):
-    container_count = reactive(0)
+class ContainerSelect(Message):
+    def __init__(self, container: Container, project: bool):
+        self.container = container
+        self.project = project
+        super().__init__()
 
-    def __init__(self, docker: DockerClient, **kargs):
-        self.containers: list[Container] = []
-        self.docker = docker
+
+class ContainersList(ResponsiveGrid):
+    BINDINGS = [
+        ("a", "select_all", "Select all"),
+        ("c", "clear_selection", "Clear selection"),
+        ("s", "bulk('start')", "Start"),
+        ("x", "bulk('stop')", "Stop"),
+        ("r", "bulk('restart')", "Restart"),
+    ]
+    container_count = reactive(0, always_update=True)
+    row_height = 6
+
+    def __init__(self, hosts: list[Host], **kargs):
+        self.hosts = hosts
+        # By store key, the widgets are unmounted when scrolled out of view
+        self.selected: set[str] = set()
+        self.pending: dict[str, str] = {}
         super().__init__(**kargs)
 
     def on_mount(self) -> None:
-        self.get_containers()
-        self.get_containers_timer = self.set_interval(2, self.get_containers)
+        if self.containers:
+            # Loaded from the snapshot, shown stale until the first refresh
+            self.container_count = len(self.containers)
+        for host in self.hosts:
+            self.app.scheduler.add(
+                f"containers@{host.name}",
+                partial(self.get_containers, host),
+                group="containers",
+                host=host.name,
+            )
+        self.app.scheduler.run_group("containers")
+        self.app.docker_events.subscribe("container", self.on_container_event)
+
+    @property
+    def containers(self) -> dict[str, Container]:
+        return store.containers
 
     async def watch_container_count(self, count: int) -> None:
-        await self.grid.remove_children()
-        images_in_use = []
-        for c in self.containers:
-            cw = ContainerWidget(c, self.docker, classes="li")
-            self.grid.mount(cw)
-            images_in_use.append(c.image.id)  # type: ignore
-        store.containers_images = images_in_use
-
-    @daemon
-    def get_containers(self) -> None:
-        self.containers = self.docker.containers.list(all=True)  # type: ignore
+        self.set_class(store.is_stale("containers"), "stale")
+        await self.update_items(
+            self.containers, lambda c: ContainerWidget(c, self, classes="li")
+        )
+
+    @background
+    def get_containers(self, host: Host) -> bool:
+        # One request for the summaries, only the new and changed containers
+        # are inspected, the events keep the others up to date
+        containers: list[Container] = []
+        for summary in host.client.api.containers(all=True):
+            container = store.containers.get(host_key(host.tag, summary["Id"]))
+            if container is None or summary_changed(container, summary):
+                try:
+                    container = host.client.containers.get(summary["Id"])
+                except errors.NotFound:
+                    continue
+            containers.append(container)  # type: ignore
+        changed = store.replace("containers", keyed(containers, host.tag), host.tag)
+        self.container_count = len(self.containers)
+        return changed
+
+    def on_container_action(self, message: ContainerAction) -> None:
+        message.stop()
+        self.run_action([message.container], message.action)
+
+    def on_container_select(self, message: ContainerSelect) -> None:
+        message.stop()
+        container = message.container
+        project = container.labels.get(COMPOSE_PROJECT_LABEL)
+        if message.project and project:
+            # Modifier + click: the whole compose project
+            ids = {
+                key(c)
+                for c in self.containers.values()
+                if c.labels.get(COMPOSE_PROJECT_LABEL) == project
+                and host_of(c) == host_of(container)
+            }
+        else:
+            ids = {key(container)}
+        if ids <= self.selected:
+            self.selected -= ids
+        else:
+            self.selected |= ids
+        self.update_widgets(ids)
+
+    def action_select_all(self) -> None:
+        self.selected = set(self.containers)
+        self.update_widgets(self.selected)
+
+    def action_clear_selection(self) -> None:
+        ids, self.selected = self.selected, set()
+        self.update_widgets(ids)
+
+    def action_bulk(self, action: str) -> None:
+        containers = [self.containers[i] for i in self.selected if i in self.containers]
+        if not containers:
+            self.notify("Select containers first by clicking on them")
+            return None
+        self.run_action(containers, action)
+
+    def run_action(self, containers: list[Container], action: str) -> None:
+        containers = [c for c in containers if key(c) not in self.pending]
+        if not containers:
+            return None
+        app = self.app
+        results: list[ActionResult] = []
+        for container in containers:
+            self.pending[key(container)] = action
+
+            def done(result: ActionResult, container_key=key(container)) -> None:
+                # From the action thread, or this one if it was already done
+                app.call_later(
+                    self.action_done, container_key, result, results, len(containers)
+                )
+
+            action_runner.submit(container, action, done)
+        self.update_widgets({key(c) for c in containers})
+
+    def action_done(
+        self, container_key: str, result: ActionResult, results: list, total: int
+    ) -> None:
+        self.pending.pop(container_key, None)
+        self.update_widgets({container_key})
+        results.append(result)
+        if len(results) < total:
+            return None
+        failed = [r for r in results if not r.ok]
+        if total > 1:
+            self.notify(
+                f"{result.action.capitalize()}: {total - len(failed)}/{total} done",
+                severity="error" if failed else "information",
+            )
+        for r in failed:
+            self.notify(f"{r.name}: {r.error}", title="Failed", severity="error")
+
+    def update_widgets(self, ids: set) -> None:
+        for container_key in ids:
+            widget = self.widgets.get(container_key)
+            if isinstance(widget, ContainerWidget) and widget.mounted:
+                widget.update_data()
+
+    def on_container_event(self, host: Host, event: dict) -> None:
+        if event.get("Action") not in CONTAINER_ACTIONS:
+            return None
+        get = host.client.containers.get
+        if not apply_event(store, "containers", event, get, host=host.tag):
+            return None
         self.container_count = len(self.containers)
 
+    def on_unmount(self):
+        self.app.docker_events.unsubscribe("container", self.on_container_event)
+        self.app.scheduler.remove("containers")
+        executor.cancel(self)
+
     def on_hide(self):
-        self.get_containers_timer.pause()
+        self.app.scheduler.set_visible("containers", False)
 
     def on_show(self):
-        self.get_containers_timer.resume()
+        self.app.scheduler.set_visible("containers", True)
 
 
 class ContainerWidget(Static):
-    def __init__(self, container: Container, client: DockerClient, **kargs):
+    def __init__(self, container: Container, container_list: ContainersList, **kargs):
         self.container = container
-        self.client = client
+        self.container_list = container_list
         self.container_id = container.id
+        self.container_key = key(container)
         self.running = False
-        self.is_visible = False
-        self.container_name = self.container.name or ""
+        self.in_viewport = False
+        self.mounted = False
+        self.container_name = display_name(container)
         super().__init__(**kargs)
 
     def compose(self) -> ComposeResult:
@@ -59,6 +234,10 @@ class ContainerWidget(Static):
             Label(self.container_name, classes="container-name bold"),
             ReactiveString(classes="status"),
             Horizontal(ReactiveString(classes="cpu"), ReactiveString(classes="mem")),
+            Horizontal(
+                HistorySparkline(self.container, "cpu", classes="cpu-chart"),
+                HistorySparkline(self.container, "mem", classes="mem-chart"),
+            ),
             classes="container-info",
         )
         yield StatusButtons(self.container)
@@ -67,56 +246,74 @@ class ContainerWidget(Static):
         self.status_widget = self.query_one(".status", ReactiveString)
         self.cpu_widget = self.query_one(".cpu", ReactiveString)
         self.mem_widget = self.query_one(".mem", ReactiveString)
-        self.set_interval(1, self.update_data)
+        self.charts = list(self.query(HistorySparkline))
         self.mounted = True
-        self.update_usage()
-        self.update_data_timer = self.set_interval(1, self.update_data, pause=True)
+        self.update_data()
 
-    @daemon
-    def update_data(self) -> None:
-        try:
-            self.container.reload()
-        except errors.NotFound:
+    def update_item(self, container: Container) -> None:
+        if container.attrs == self.container.attrs:
             return None
+        self.container = container
+        self.container_name = display_name(container)
+        if self.mounted:
+            self.query_one(".container-name", Label).update(self.container_name)
+            self.update_data()
+
+    def update_data(self) -> None:
+        # The container is kept up to date by ContainersList from docker events
+        status = self.container.status.capitalize()
+        self.running = status == "Running"
+        pending = self.container_list.pending.get(self.container_key)
+        if pending:
+            self.status_widget.text = f"[yellow]{PENDING_TEXT[pending]}..."
         else:
-            status = self.container.status.capitalize()
-            self.running = status == "Running"
             self.status_widget.text = (
                 "[green]" if self.running else "[bright_black]"
             ) + status
-            self.classes = "li running" if self.running else "li"
+        self.set_class(self.running, "running")
+        self.set_class(self.container_key in self.container_list.selected, "selected")
+        self.query_one(StartStopButton).running = self.running
+        self.query_one(StatusButtons).disabled = pending is not None
+        self.update_usage()
+
+    def on_click(self, event: Click) -> None:
+        # Clicks on the buttons don't get here
+        modifier = event.ctrl or event.shift or event.meta
+        self.post_message(ContainerSelect(self.container, modifier))
 
-    @daemon
     def update_usage(self) -> None:
-        for stat in self.container.stats(stream=True, decode=True):
-            if not self.mounted:  # finish the thread
-                return None
-            if not self.is_visible:
-                continue
-            if self.running:
-                cpu_text = f"CPU: {get_cpu_usage(stat):.1f}%"
-                mem, mem_percent = get_mem_usage(stat)
-                data_unit = "MB"
-                if mem >= 1000:
-                    mem = mem / 1000
-                    data_unit = "GB"
-                mem_text = f"MEM: {mem:.1f}{data_unit}({mem_percent:.1f}%)"
-            else:
-                cpu_text = "CPU: -"
-                mem_text = "MEM: -"
-            self.cpu_widget.text = cpu_text
-            self.mem_widget.text = mem_text
+        # Only running containers on screen get a stats stream
+        if self.mounted and self.running and self.in_viewport:
+            self.app.stats_service.subscribe(self.container, self.on_stats)
+        else:
+            self.app.stats_service.unsubscribe(self.container_id, self.on_stats)
+            if self.mounted:
+                self.cpu_widget.text = "CPU: -"
+                self.mem_widget.text = "MEM: -"
+        if self.mounted:
+            # Still shown after a stop, a crash is often preceded by a spike
+            for chart in self.charts:
+                chart.update_history()
+
+    def on_stats(self, sample: StatsSample) -> None:
+        mem = sample.mem
+        data_unit = "MB"
+        if mem >= 1000:
+            mem = mem / 1000
+            data_unit = "GB"
+        self.cpu_widget.text = f"CPU: {sample.cpu:.1f}%"
+        self.mem_widget.text = f"MEM: {mem:.1f}{data_unit}({sample.mem_percent:.1f}%)"
+        for chart in self.charts:
+            chart.update_history()
+
+    def set_in_viewport(self, in_viewport: bool) -> None:
+        if in_viewport != self.in_viewport:
+            self.in_viewport = in_viewport
+            self.update_usage()
 
     def on_unmount(self):
         self.mounted = False
-
-    def on_hide(self):
-        self.update_data_timer.pause()
-        self.is_visible = False
-
-    def on_show(self):
-        self.update_data_timer.resume()
-        self.is_visible = True
+        self.update_usage()
 
 
 class StatusButtons(Static):
@@ -140,12 +337,10 @@ class StartStopButton(Static):
         self.container = container
         super().__init__(**kargs)
 
-    def on_click(self) -> None:
-        self.running = not self.running
-        if self.running:
-            self.container.start()
-        else:
-            self.container.stop()
+    def on_click(self, event: Click) -> None:
+        event.stop()
+        action = "stop" if self.running else "start"
+        self.post_message(ContainerAction(self.container, action))
 
     def on_mount(self) -> None:
         self.button = self.query_one(CustomButton)
@@ -166,8 +361,9 @@ class RestartButton(Static):
         self.container = container
         super().__init__(**kargs)
 
-    def on_click(self) -> None:
-        self.container.restart()
+    def on_click(self, event: Click) -> None:
+        event.stop()
+        self.post_message(ContainerAction(self.container, "restart"))
 
     def compose(self) -> ComposeResult:
         yield CustomButton("↻ Restart", color="orange")
@@ -1,11 +1,16 @@
+import asyncio
 import math
+from typing import Any, Callable
 from textual.app import ComposeResult
+from textual.widget import Widget
 from textual.widgets import Static
 from textual.reactive import reactive
 from textual.containers import VerticalScroll, Grid
 from textual.events import Resize
 from rich.text import TextType
 
+from .profiling import profiler
+
 
 class CustomButton(Static):
     text = reactive("")
@@ -29,18 +34,37 @@ class CustomButton(Static):
         self.color = self.start_color
 
 
+# Must match the grid-rows of ResponsiveGrid in style.css
+ROW_HEIGHT = 5
+# Rows mounted above and below the visible area
+OVERSCAN_ROWS = 2
+
+
 class ResponsiveGrid(VerticalScroll):
     container_count = reactive(0)
+    # Height of the items, must match grid-rows in the css
+    row_height = ROW_HEIGHT
 
     def __init__(self, **kargs):
         self.grid = Grid()
+        self.spacer_top = Static(classes="spacer")
+        self.spacer_bottom = Static(classes="spacer")
+        self.widgets: dict[str, Widget] = {}
+        # Lightweight row model, only the rows in the window get a widget
+        self.rows: list[tuple[str, Any]] = []
+        self.create_widget: Callable[[Any], Widget] | None = None
+        self.columns = 1
+        self.window: tuple[int, int] = (0, 0)
         self.is_visible = False
         super().__init__(**kargs)
 
     def compose(self) -> ComposeResult:
+        yield self.spacer_top
         yield self.grid
+        yield self.spacer_bottom
 
     def on_mount(self) -> None:
+        self.window_lock = asyncio.Lock()
         self.resize()
         self.grid.styles.grid_columns = "1fr"
         self.grid.styles.width = "100%"
@@ -48,11 +72,99 @@ class ResponsiveGrid(VerticalScroll):
 
     def on_resize(self, e: Resize):
         self.resize()
+        self.call_after_refresh(self.render_window, True)
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if self.get_window() != self.window:
+            self.call_after_refresh(self.render_window)
+        else:
+            self.call_after_refresh(self.update_viewport)
+
+    async def update_items(
+        self, items: dict[str, Any], create: Callable[[Any], Widget]
+    ) -> None:
+        self.rows = list(items.items())
+        self.create_widget = create
+        await self.render_window(force=True)
+
+    def get_window(self) -> tuple[int, int]:
+        total_rows = math.ceil(len(self.rows) / self.columns)
+        visible_rows = math.ceil(self.size.height / self.row_height) + 1
+        first_row = int(self.scroll_y) // self.row_height
+        return (
+            max(0, first_row - OVERSCAN_ROWS),
+            min(total_rows, first_row + visible_rows + OVERSCAN_ROWS),
+        )
+
+    async def render_window(self, force: bool = False) -> None:
+        if self.create_widget is None:
+            return None
+        async with self.window_lock:
+            window = self.get_window()
+            if window == self.window and not force:
+                return None
+            self.window = window
+            first_row, last_row = window
+            total_rows = math.ceil(len(self.rows) / self.columns)
+            self.spacer_top.styles.height = first_row * self.row_height
+            self.spacer_bottom.styles.height = (total_rows - last_row) * self.row_height
+            rows = self.rows[first_row * self.columns : last_row * self.columns]
+            with profiler.timed(f"{type(self).__name__} mount"):
+                await self.reconcile(dict(rows), self.create_widget)
+
+    async def reconcile(
+        self, items: dict[str, Any], create: Callable[[Any], Widget]
+    ) -> None:
+        """Sync the grid with items keyed by ID, touching only the widgets that changed.
+
+        New items are mounted with `create`, items that are gone are removed and
+        the remaining widgets get the new object through their `update_item`."""
+        items_list = list(items.items())
+        keys = set(items)
+        removed = [self.widgets.pop(k) for k in list(self.widgets) if k not in keys]
+        if removed:
+            await asyncio.gather(*(w.remove() for w in removed))
+        mounts = []
+        for index, (key, item) in enumerate(items_list):
+            widget = self.widgets.get(key)
+            if widget is None:
+                widget = self.widgets[key] = create(item)
+                if index < len(self.grid.children):
+                    mounts.append(self.grid.mount(widget, before=index))
+                else:
+                    mounts.append(self.grid.mount(widget))
+                continue
+            if hasattr(widget, "update_item"):
+                widget.update_item(item)  # type: ignore
+            if self.grid.children[index] is not widget:
+                self.grid.move_child(widget, before=index)
+        # Wait for the new widgets, so the next call can't remove them mid-mount
+        await asyncio.gather(*mounts)
+        self.call_after_refresh(self.update_viewport)
+
+    def update_viewport(self) -> None:
+        # Let the items know if they are inside the scrolled area
+        region = self.region
+        for child in self.grid.children:
+            if hasattr(child, "set_in_viewport"):
+                in_viewport = self.is_visible and child.region.overlaps(region)
+                child.set_in_viewport(in_viewport)  # type: ignore
+
+    # The items get a Hide when scrolled out but no Show when scrolled back
+    # (textual 0.35), so they follow the visibility of the grid instead
+    def on_show(self) -> None:
+        self.is_visible = True
+        self.call_after_refresh(self.update_viewport)
+
+    def on_hide(self) -> None:
+        self.is_visible = False
+        self.update_viewport()
 
     def resize(self):
         min_container_width = 75
-        columns = math.floor(self.size.width / min_container_width)
-        self.grid.styles.grid_size_columns = columns
+        self.columns = max(1, math.floor(self.size.width / min_container_width))
+        self.grid.styles.grid_size_columns = self.columns
 
 
 class ReactiveString(Static):
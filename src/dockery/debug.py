@@ -0,0 +1,52 @@
+from typing import Optional
+from rich.console import Group
+from rich.table import Table
+from textual.timer import Timer
+from textual.widgets import Static
+
+from .profiling import profiler, report_tables
+from .utils import executor
+
+
+class DebugOverlay(Static):
+    """Docker API calls, threads, streams and refresh timings, shown over the
+    lists and updated every second while it's open."""
+
+    def __init__(self, **kargs):
+        self.timer: Optional[Timer] = None
+        super().__init__(**kargs)
+
+    def on_mount(self) -> None:
+        self.timer = self.set_interval(1, self.update_report, pause=True)
+
+    def update_report(self) -> None:
+        report = profiler.report()
+        cadence = Table(
+            "Refresh", "Every s", "Took s", "Next s", "Errors", title="Scheduler"
+        )
+        for task in self.app.scheduler.cadence():
+            cadence.add_row(
+                task["name"],
+                str(task["interval"]),
+                str(task["latency"]),
+                "hidden" if task["next"] is None else str(task["next"]),
+                str(task["errors"]),
+            )
+        pool = executor.stats()
+        stats = self.app.stats_service
+        lines = (
+            f"Background calls: {pool['in_flight']} running, {pool['queued']} "
+            f"queued, {pool['max_workers']} threads\n"
+            f"Stats streams: {len(stats.open_streams)} open of "
+            f"{stats.max_streams}, {len(stats.subscribers)} containers shown"
+        )
+        self.update(Group(*report_tables(report), cadence, lines))
+
+    def on_show(self) -> None:
+        if self.timer is not None:
+            self.timer.resume()
+        self.update_report()
+
+    def on_hide(self) -> None:
+        if self.timer is not None:
+            self.timer.pause()
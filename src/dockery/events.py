@@ -0,0 +1,90 @@
+import time
+from collections import defaultdict
+from typing import Any, Callable, Optional
+from docker import errors
+from docker.types.daemon import CancellableStream
+
+from .utils import daemon, close_stream
+from .models import Kind, Store
+from .hosts import Host, host_key, tag
+
+# Full list() resync, only as a safety net for missed events
+RESYNC_INTERVAL = 30
+# Longest wait before reconnecting to a daemon that keeps failing
+MAX_RECONNECT_DELAY = 30
+
+EventHandler = Callable[[Host, dict], None]
+
+
+class DockerEvents:
+    """Events of all the hosts, each one listened in its own thread."""
+
+    def __init__(self, hosts: list[Host]):
+        self.hosts = hosts
+        self.handlers: defaultdict[str, list[EventHandler]] = defaultdict(list)
+        self.running = False
+        self.streams: dict[str, CancellableStream] = {}
+
+    def subscribe(self, event_type: str, handler: EventHandler) -> None:
+        self.handlers[event_type].append(handler)
+
+    def unsubscribe(self, event_type: str, handler: EventHandler) -> None:
+        if handler in self.handlers[event_type]:
+            self.handlers[event_type].remove(handler)
+
+    def start(self) -> None:
+        if self.running:
+            return None
+        self.running = True
+        for host in self.hosts:
+            self.listen(host)
+
+    def stop(self) -> None:
+        self.running = False
+        for stream in list(self.streams.values()):
+            close_stream(stream)
+
+    @daemon
+    def listen(self, host: Host) -> None:
+        delay = 1
+        while self.running:
+            try:
+                stream = self.streams[host.name] = host.client.events(decode=True)  # type: ignore
+                for event in stream:
+                    if not self.running:
+                        return None
+                    delay = 1
+                    for handler in list(self.handlers[event.get("Type", "")]):
+                        handler(host, event)
+            except errors.DockerException:
+                pass
+            except OSError:
+                pass
+            # The stream was interrupted, reconnect after a pause that doubles
+            # while the daemon keeps failing
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def apply_event(
+    store: Store,
+    kind: Kind,
+    event: dict,
+    get: Callable[[str], Any],
+    remove_actions: tuple = ("destroy",),
+    host: Optional[str] = None,
+) -> bool:
+    """Apply a single event of a host to the objects of a kind in the store.
+
+    Returns True if the store changed."""
+    actor_id = event.get("Actor", {}).get("ID", "")
+    if not actor_id:
+        return False
+    if event.get("Action") in remove_actions:
+        return store.remove(kind, host_key(host, actor_id))
+    try:
+        obj = get(actor_id)
+    except errors.NotFound:
+        return store.remove(kind, host_key(host, actor_id))
+    store.put(kind, tag(obj, host))
+    return True
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, Optional
+from docker import errors
+from docker.models.containers import Container
+
+from .utils import open_logs_stream, close_stream, parse_timestamp_ns
+from .hosts import display_name, host_of
+
+COMPRESSIONS = {"gzip": ".log.gz", "zstd": ".log.zst"}
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def open_compressed(path: Path, compression: str) -> IO[bytes]:
+    if compression == "zstd":
+        # Optional dependency: pip install dockery[zstd]
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+    import gzip
+
+    # The default level 9 is several times slower for a slightly smaller file
+    return gzip.open(path, "wb", compresslevel=6)
+
+
+def read_checkpoint(directory: Path) -> Optional[str]:
+    try:
+        with open(directory / CHECKPOINT_FILE) as file:
+            return json.load(file)["last_timestamp"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_checkpoint(directory: Path, container: Container, timestamp: str) -> None:
+    # Replaced atomically, a crash leaves the previous checkpoint
+    tmp = directory / (CHECKPOINT_FILE + ".tmp")
+    with open(tmp, "w") as file:
+        json.dump({"id": container.id, "last_timestamp": timestamp}, file)
+    os.replace(tmp, directory / CHECKPOINT_FILE)
+
+
+def since_param(timestamp: str) -> str:
+    # The API takes the nanoseconds, a float would lose them
+    seconds, nanos = divmod(parse_timestamp_ns(timestamp), 10**9)
+    return f"{seconds}.{nanos:09d}"
+
+
+class LogExport:
+    """Writes the logs after the last checkpoint to a new compressed file.
+
+    Each run writes DIR/<name>/<time>.log.gz, renamed to its final name and
+    checkpointed only once complete, so an interrupted export is simply done
+    again by the next run. Lines keep their timestamp."""
+
+    def __init__(self, container: Container, directory: str, compression: str):
+        self.container = container
+        self.name: str = container.name or container.id  # type: ignore
+        host = host_of(container)
+        # A folder per host, the same name can be used in several of them
+        self.folder = Path(directory, *([host] if host else []), self.name)
+        self.display_name = display_name(container)
+        self.compression = compression
+        self.last: Optional[str] = None
+        self.last_ns = -1
+        self.lines = 0
+        self.size = 0
+
+    def run(self) -> dict:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        for part in self.folder.glob("*.part"):
+            part.unlink()
+        self.last = read_checkpoint(self.folder)
+        self.last_ns = parse_timestamp_ns(self.last) if self.last else -1
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+        extension = COMPRESSIONS[self.compression]
+        path = self.folder / f"{stamp}.{int(now % 1 * 1e6):06d}{extension}"
+        part = path.with_name(path.name + ".part")
+        since = since_param(self.last) if self.last else None
+        stream = open_logs_stream(self.container, timestamps=True, since=since)
+        try:
+            with open_compressed(part, self.compression) as file:
+                rest = b""
+                for block in stream:
+                    data = rest + block
+                    end = data.rfind(b"\n") + 1
+                    data, rest = data[:end], data[end:]
+                    self.write(file, data)
+                if rest:
+                    self.write(file, rest + b"\n")
+        finally:
+            close_stream(stream)
+        if not self.lines:
+            part.unlink()
+            return {"name": self.display_name, "lines": 0, "bytes": 0, "file": None}
+        os.replace(part, path)
+        write_checkpoint(self.folder, self.container, self.last)  # type: ignore
+        return {
+            "name": self.display_name,
+            "lines": self.lines,
+            "bytes": self.size,
+            "file": str(path),
+        }
+
+    def write(self, file: IO[bytes], data: bytes) -> None:
+        # Complete lines only, the timestamp of the last one is the checkpoint
+        if self.last_ns >= 0:
+            # `since` is inclusive, skip what the last export wrote
+            data, self.last_ns = skip_exported(data, self.last_ns)
+        if not data:
+            return None
+        file.write(data)
+        self.lines += data.count(b"\n")
+        self.size += len(data)
+        start = data.rfind(b"\n", 0, len(data) - 1) + 1
+        self.last = data[start:].partition(b" ")[0].decode()
+
+
+def export_logs(container: Container, directory: str, compression: str) -> dict:
+    try:
+        return LogExport(container, directory, compression).run()
+    except (errors.DockerException, OSError) as error:
+        return {"name": display_name(container), "error": str(error)}
+
+
+def skip_exported(data: bytes, last_ns: int) -> tuple[bytes, int]:
+    """Drops the lines not newer than last_ns, returns -1 once past them."""
+    position = 0
+    while position < len(data):
+        end = data.index(b"\n", position) + 1
+        timestamp = data[position:end].partition(b" ")[0].decode()
+        try:
+            if parse_timestamp_ns(timestamp) > last_ns:
+                return data[position:], -1
+        except ValueError:
+            return data[position:], -1
+        position = end
+    return b"", last_ns
@@ -0,0 +1,207 @@
+import heapq
+import time
+from concurrent.futures import Executor
+from typing import Iterable, Optional
+from docker import errors
+from docker.models.containers import Container
+
+from .hosts import display_name, host_of, key
+from .models import StatsSample
+from .stats import StatsService
+from .utils import (
+    get_blk_io,
+    get_mem_usage,
+    get_net_io,
+    get_stats,
+    has_one_shot,
+    parse_timestamp,
+)
+
+# Read from each stats response, one column each
+COUNTERS = (
+    "time",
+    "cpu_total",
+    "system_total",
+    "cpus",
+    "mem",
+    "mem_percent",
+    "net_rx",
+    "net_tx",
+    "blk_read",
+    "blk_write",
+)
+# Computed for each container: CPU %, memory in MB and I/O in bytes/s
+METRICS = ("cpu", "mem", "mem_percent", "net_rx", "net_tx", "blk_read", "blk_write")
+RATES = ("net_rx", "net_tx", "blk_read", "blk_write")
+TOTALS = ("cpu", "mem", "net_rx", "net_tx", "blk_read", "blk_write")
+
+
+def read_counters(stats: dict) -> tuple:
+    cpu_stats = stats.get("cpu_stats") or {}
+    cpus = cpu_stats.get("online_cpus") or len(
+        cpu_stats.get("cpu_usage", {}).get("percpu_usage") or [1]
+    )
+    read = stats.get("read")
+    mem, mem_percent = get_mem_usage(stats)
+    return (
+        parse_timestamp(read) if read else time.time(),
+        cpu_stats.get("cpu_usage", {}).get("total_usage", 0),
+        cpu_stats.get("system_cpu_usage", 0),
+        cpus,
+        mem,
+        mem_percent,
+        *get_net_io(stats),
+        *get_blk_io(stats),
+    )
+
+
+def fetch_stats(
+    containers: Iterable[Container], pool: Executor
+) -> list[tuple[Container, dict]]:
+    """A stats response of each container, the ones that fail are left out."""
+
+    def fetch(container: Container) -> Optional[tuple[Container, dict]]:
+        try:
+            return container, get_stats(container)
+        except (errors.DockerException, OSError):
+            # Stopped or removed since it was listed, or its host is down
+            return None
+
+    return [s for s in pool.map(fetch, containers) if s is not None]
+
+
+class FleetSampler:
+    """The latest stats response of each container, for FleetStats.
+
+    Containers with an open stats stream in `shared` (the cards on screen)
+    are read from it, the others get a one-shot request. Without one-shot
+    (API < 1.41) each request waits a second for the daemon, so they get a
+    stream of their own instead, kept until stop()."""
+
+    def __init__(self, pool: Executor, shared: Optional[StatsService] = None):
+        self.pool = pool
+        self.shared = shared
+        self.streams = StatsService()
+        self.streamed: set[str] = set()
+
+    def fetch(self, containers: list[Container]) -> list[tuple[Container, dict]]:
+        samples = []
+        polled = []
+        streamed = set()
+        # One stream per container at most, like `stats --watch`
+        self.streams.max_streams = max(1, len(containers))
+        for c in containers:
+            stats = self.shared.last_stats(c.id) if self.shared else None  # type: ignore
+            if stats is None and not has_one_shot(c):
+                streamed.add(c.id)
+                self.streams.subscribe(c, self.ignore)
+                stats = self.streams.last_stats(c.id)  # type: ignore
+            if stats is not None:
+                samples.append((c, stats))
+            elif has_one_shot(c):
+                polled.append(c)
+        # Streams of the containers no longer listed, or now on a card
+        for container_id in self.streamed - streamed:
+            self.streams.unsubscribe(container_id, self.ignore)
+        self.streamed = streamed
+        return samples + fetch_stats(polled, self.pool)
+
+    def wait_streams(self, timeout: float) -> bool:
+        """Waits until the streams opened by fetch() have a response, False
+        if there are none."""
+        waiting = list(self.streamed)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(
+            self.streams.last_stats(c) is None for c in waiting
+        ):
+            time.sleep(0.1)
+        return len(waiting) > 0
+
+    def ignore(self, sample: StatsSample) -> None:
+        # Read with last_stats() instead
+        pass
+
+    def stop(self) -> None:
+        self.streams.stop()
+        self.streamed.clear()
+
+
+class FleetStats:
+    """CPU, memory and I/O rates of many containers from the deltas between
+    two refreshes.
+
+    The counters are kept in a list per field and each metric is computed
+    with a comprehension over those lists, without an object per container."""
+
+    def __init__(self):
+        self.keys: list[str] = []
+        self.names: list[str] = []
+        self.hosts: list[Optional[str]] = []
+        self.counters: dict[str, list[float]] = {c: [] for c in COUNTERS}
+        self.metrics: dict[str, list[float]] = {m: [] for m in METRICS}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def update(self, samples: list[tuple[Container, dict]]) -> None:
+        positions = {k: i for i, k in enumerate(self.keys)}
+        previous = self.counters
+        self.keys = [key(c) for c, _ in samples]
+        self.names = [display_name(c) for c, _ in samples]
+        self.hosts = [host_of(c) for c, _ in samples]
+        rows = [read_counters(stats) for _, stats in samples]
+        columns = list(zip(*rows)) if rows else [()] * len(COUNTERS)
+        counters = {c: list(column) for c, column in zip(COUNTERS, columns)}
+        # The previous counters in the new order, a new container has no delta
+        order = [positions.get(k, -1) for k in self.keys]
+        before = {
+            c: [previous[c][i] if i >= 0 else v for i, v in zip(order, counters[c])]
+            for c in COUNTERS
+        }
+        elapsed = [t - p for t, p in zip(counters["time"], before["time"])]
+        self.metrics["cpu"] = [
+            (c - pc) / (s - ps) * n * 100 if s > ps and c >= pc else 0.0
+            for c, pc, s, ps, n in zip(
+                counters["cpu_total"],
+                before["cpu_total"],
+                counters["system_total"],
+                before["system_total"],
+                counters["cpus"],
+            )
+        ]
+        self.metrics["mem"] = counters["mem"]
+        self.metrics["mem_percent"] = counters["mem_percent"]
+        for metric in RATES:
+            # The totals start again from 0 when a container restarts
+            self.metrics[metric] = [
+                (v - p) / e if e > 0 and v >= p else 0.0
+                for v, p, e in zip(counters[metric], before[metric], elapsed)
+            ]
+        self.counters = counters
+
+    def top(self, metric: str, limit: Optional[int] = None) -> list[int]:
+        """Positions of the containers with the highest values first."""
+        column = self.metrics[metric]
+        if limit is None or limit >= len(column):
+            return sorted(range(len(column)), key=column.__getitem__, reverse=True)
+        return heapq.nlargest(limit, range(len(column)), key=column.__getitem__)
+
+    def row(self, position: int) -> dict:
+        row: dict = {"name": self.names[position]}
+        if self.hosts[position] is not None:
+            row["host"] = self.hosts[position]
+        for metric in METRICS:
+            row[metric] = self.metrics[metric][position]
+        return row
+
+    def totals(self) -> dict[Optional[str], dict]:
+        """Number of containers and sum of their metrics, by host."""
+        totals: dict[Optional[str], dict] = {}
+        for host in self.hosts:
+            if host not in totals:
+                totals[host] = {"containers": 0, **dict.fromkeys(TOTALS, 0.0)}
+            totals[host]["containers"] += 1
+        for metric in TOTALS:
+            for host, value in zip(self.hosts, self.metrics[metric]):
+                totals[host][metric] += value
+        return totals
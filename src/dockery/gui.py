@@ -1,35 +1,89 @@
 from textual.app import App, ComposeResult
 from textual.widgets import Footer, ContentSwitcher, Tabs, Tab
 from textual.widgets._header import HeaderClock
-from textual.containers import (
-    VerticalScroll,
-    Horizontal,
-)
-from docker import DockerClient
+from textual.containers import Horizontal
 
 from .containers import ContainersList
 from .images import ImagesList
 from .networks import NetworkList
 from .volumes import VolumesList
+from .events import DockerEvents
+from .stats import StatsService
+from .logs import LogsView
+from .top import TopView
+from .debug import DebugOverlay
+from .models import HIGHLIGHT_MAX_RATE, store
+from .metrics import metrics_store
+from .snapshot import save_snapshot
+from .scheduler import PollTask, Scheduler
+from .hosts import Host
+from .utils import executor
 
 
 class AppGUI(App):
     CSS_PATH = "style.css"
     BINDINGS = [
         ("d", "toggle_dark", "Toggle dark mode"),
+        ("ctrl+f", "search_logs", "Search logs"),
+        ("f2", "toggle_debug", "Debug"),
         ("q", "quit", "Quit"),
     ]
     TITLE = "DOCKERY"
 
-    def __init__(self, docker: DockerClient, **kargs):
-        self.docker = docker
+    def __init__(
+        self,
+        hosts: list[Host],
+        snapshot: bool = True,
+        highlight_max_rate: int = HIGHLIGHT_MAX_RATE,
+        **kargs,
+    ):
+        self.hosts = hosts
+        # Save the lists of each host on exit
+        self.snapshot = snapshot
+        self.highlight_max_rate = highlight_max_rate
+        self.docker_events = DockerEvents(hosts)
+        self.stats_service = StatsService(history=metrics_store)
+        self.scheduler = Scheduler(on_error=self.on_refresh_error)
         super().__init__(**kargs)
 
+    def on_mount(self) -> None:
+        self.docker_events.start()
+        self.set_interval(1, self.scheduler.tick)
+
+    def on_unmount(self) -> None:
+        self.docker_events.stop()
+        self.stats_service.stop()
+        # The threads keep the app they first used (textual's active_app)
+        executor.shutdown()
+        if not self.snapshot:
+            return None
+        for host in self.hosts:
+            try:
+                save_snapshot(host, store)
+            except OSError:
+                pass
+
+    def on_refresh_error(self, task: PollTask, error: BaseException) -> None:
+        # From a worker thread, or the UI's when the fetch was already done,
+        # once per host until all its lists work again
+        if any(
+            t.host == task.host and t.errors and t is not task
+            for t in list(self.scheduler.tasks.values())
+        ):
+            return None
+        self.call_later(
+            self.notify,
+            f"{task.host or task.name}: {error}",
+            title="Refresh failed",
+            severity="error",
+        )
+
     def compose(self) -> ComposeResult:
         with Horizontal(id="header"):
             yield HeaderClock()
             yield Tabs(
                 Tab("Containers", id="container-list"),
+                Tab("Top", id="top"),
                 Tab("Images", id="image-list"),
                 Tab("Networks", id="network-list"),
                 Tab("Volumes", id="volume-list"),
@@ -38,11 +92,21 @@ class AppGUI(App):
             )
         yield Footer()
         with ContentSwitcher():
-            yield ContainersList(self.docker, id="container-list")
-            yield VerticalScroll(id="container-logs")
-            yield ImagesList(self.docker, id="image-list")
-            yield NetworkList(self.docker, id="network-list")
-            yield VolumesList(self.docker, id="volume-list")
+            yield ContainersList(self.hosts, id="container-list")
+            yield TopView(id="top")
+            yield LogsView(id="container-logs")
+            yield ImagesList(self.hosts, id="image-list")
+            yield NetworkList(self.hosts, id="network-list")
+            yield VolumesList(self.hosts, id="volume-list")
+        yield DebugOverlay(id="debug")
+
+    def action_search_logs(self) -> None:
+        self.query_one("#nav", Tabs).active = "container-logs"
+        self.query_one(LogsView).focus_search()
+
+    def action_toggle_debug(self) -> None:
+        overlay = self.query_one(DebugOverlay)
+        overlay.display = not overlay.display
 
     def on_tabs_tab_activated(self, event: Tabs.TabActivated) -> None:
         self.query_one(ContentSwitcher).current = event.tab.id
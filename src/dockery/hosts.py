@@ -0,0 +1,183 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+from urllib.parse import urlparse
+import docker
+from docker import DockerClient
+
+from .profiling import profiler
+
+T = TypeVar("T")
+
+# Seconds to wait for each response of a server
+DEFAULT_TIMEOUT = 10.0
+
+
+@dataclass(eq=False)
+class Host:
+    name: str
+    # Server url, also the key of its snapshot
+    url: str
+    client: DockerClient
+    # Name added to the objects of this host, None when it's the only one
+    tag: Optional[str] = None
+    # Seconds for each response, and for a whole fetch_all()
+    timeout: Optional[float] = None
+
+
+def server_url(server: Optional[str]) -> str:
+    # The client base_url is the same for every unix socket or ssh host
+    return server or os.environ.get("DOCKER_HOST") or "unix:///var/run/docker.sock"
+
+
+def host_name(url: str) -> str:
+    parsed = urlparse(url)
+    if parsed.scheme in ("unix", "npipe") or not parsed.hostname:
+        return "local"
+    return parsed.hostname + (f":{parsed.port}" if parsed.port else "")
+
+
+def read_hosts_file(path: str) -> list[tuple[Optional[str], str, Optional[float]]]:
+    """One server per line, `url` or `name url`, optionally followed by
+    `timeout=SECONDS`, # starts a comment."""
+    hosts: list[tuple[Optional[str], str, Optional[float]]] = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split("#", 1)[0].split()
+            timeout = None
+            if fields and fields[-1].startswith("timeout="):
+                try:
+                    timeout = float(fields.pop()[len("timeout=") :])
+                except ValueError:
+                    raise ValueError(f"{path}: invalid timeout: {line!r}") from None
+            if len(fields) == 1:
+                hosts.append((None, fields[0], timeout))
+            elif len(fields) == 2:
+                hosts.append((fields[0], fields[1], timeout))
+            elif fields or timeout is not None:
+                raise ValueError(
+                    f"{path}: expected `url` or `name url` [timeout=SECONDS]: {line!r}"
+                )
+    return hosts
+
+
+def client_options(timeout: Optional[float]) -> dict[str, Any]:
+    # None keeps the default of docker, not no timeout at all
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def connect(
+    servers: tuple,
+    hosts_file: Optional[str],
+    ssh: bool,
+    api_version: str,
+    timeout: Optional[float] = DEFAULT_TIMEOUT,
+) -> list[Host]:
+    """A client for each server, no request is made here.
+
+    `timeout` applies to the servers without one in the hosts file."""
+    entries: list[tuple[Optional[str], str, Optional[float]]] = [
+        (None, s, None) for s in servers
+    ]
+    if hosts_file is not None:
+        entries += read_hosts_file(hosts_file)
+    hosts: list[Host] = []
+    if not entries:
+        client = docker.from_env(**client_options(timeout))
+        hosts.append(Host("local", server_url(None), client, timeout=timeout))
+    names: set[str] = set()
+    for name, url, host_timeout in entries:
+        name = name or host_name(url)
+        unique, number = name, 2
+        while unique in names:
+            unique, number = f"{name}-{number}", number + 1
+        names.add(unique)
+        if host_timeout is None:
+            host_timeout = timeout
+        client = docker.DockerClient(
+            base_url=url,
+            version=api_version,
+            use_ssh_client=ssh,
+            **client_options(host_timeout),
+        )
+        hosts.append(Host(unique, url, client, timeout=host_timeout))
+    if len(hosts) > 1:
+        for host in hosts:
+            host.tag = host.name
+    for host in hosts:
+        profiler.instrument(host.client, host.name)
+    return hosts
+
+
+def tag(obj: T, host: Optional[str]) -> T:
+    if host is not None:
+        obj.host = host  # type: ignore
+    return obj
+
+
+def host_of(obj: Any) -> Optional[str]:
+    return getattr(obj, "host", None)
+
+
+def host_key(host: Optional[str], obj_id: str) -> str:
+    # Object IDs are only unique in their host, the same image can be in all
+    return obj_id if host is None else f"{host}/{obj_id}"
+
+
+def key(obj: Any) -> str:
+    return host_key(host_of(obj), obj.id)
+
+
+def keyed(objects: Iterable[T], host: Optional[str]) -> dict[str, T]:
+    """Objects of a host tagged with it, by store key."""
+    tagged = [tag(obj, host) for obj in objects]
+    return {key(obj): obj for obj in tagged}
+
+
+def display_name(obj: Any) -> str:
+    host = host_of(obj)
+    name = obj.name or ""
+    return name if host is None else f"{host}/{name}"
+
+
+def fetch_all(
+    hosts: list[Host], fetch: Callable[[Host], T]
+) -> Iterator[tuple[Host, Optional[T], Optional[Exception]]]:
+    """fetch() on all the hosts at the same time, results as each one is done.
+
+    A failing host gives its exception instead of stopping the others, and
+    one that takes longer than its timeout a TimeoutError."""
+    if len(hosts) == 1:
+        try:
+            yield hosts[0], fetch(hosts[0]), None
+        except Exception as error:
+            yield hosts[0], None, error
+        return None
+    pool = ThreadPoolExecutor(len(hosts), thread_name_prefix="host")
+    start = time.monotonic()
+    futures = {pool.submit(fetch, host): host for host in hosts}
+    deadlines = {
+        f: start + h.timeout for f, h in futures.items() if h.timeout is not None
+    }
+    pending = set(futures)
+    try:
+        while pending:
+            waiting = [deadlines[f] for f in pending if f in deadlines]
+            timeout = max(0.0, min(waiting) - time.monotonic()) if waiting else None
+            done, pending = wait(pending, timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    yield futures[future], future.result(), None
+                else:
+                    yield futures[future], None, error  # type: ignore
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines.get(f, now + 1) <= now]:
+                pending.discard(future)
+                host = futures[future]
+                yield host, None, TimeoutError(f"No response in {host.timeout}s")
+    finally:
+        # Not waiting for the late hosts, their requests end at the socket timeout
+        pool.shutdown(wait=False, cancel_futures=True)
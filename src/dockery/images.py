@@ -1,43 +1,85 @@
+from functools import partial
 from textual.app import ComposeResult
 from textual.widgets import Static, Label
 from textual.reactive import reactive
-from textual.containers import Vertical
+from textual.containers import Vertical, Horizontal
 from docker import DockerClient
 from docker.models.images import Image
 
 from .custom_widgets import ResponsiveGrid
 from .models import store
-from .utils import daemon
+from .utils import background, executor
+from .events import apply_event
+from .hosts import Host, host_of, key, keyed
 
 
 class ImagesList(ResponsiveGrid):
-    images_count = reactive(0)
+    images_count = reactive(0, always_update=True)
+    # Bumped when the containers change, the images in use may be others
+    usage_version = reactive(0, always_update=True)
 
-    def __init__(self, docker: DockerClient, **kargs):
-        self.images: list[Image] = []
-        self.docker = docker
+    def __init__(self, hosts: list[Host], **kargs):
+        self.hosts = hosts
         super().__init__(**kargs)
 
+    @property
+    def images(self) -> dict[str, Image]:
+        return store.images
+
     def on_mount(self) -> None:
-        self.get_images()
-        self.get_images_timer = self.set_interval(2, self.get_images, pause=True)
+        if self.images:
+            self.images_count = len(self.images)
+        for host in self.hosts:
+            self.app.scheduler.add(
+                f"images@{host.name}",
+                partial(self.get_images, host),
+                group="images",
+                host=host.name,
+            )
+        self.app.scheduler.run_group("images")
+        self.app.docker_events.subscribe("image", self.on_image_event)
+        store.subscribe("containers", self.on_containers_change)
 
     async def watch_images_count(self, count: int) -> None:
-        await self.grid.remove_children()
-        for c in self.images:
-            cw = ImageWidget(c, self.docker, classes="li")
-            self.grid.mount(cw)
-
-    @daemon
-    def get_images(self) -> None:
-        self.images = self.docker.images.list(all=False)  # type: ignore
+        self.set_class(store.is_stale("images"), "stale")
+        await self.update_items(
+            self.images, lambda c: ImageWidget(c, c.client, classes="li")
+        )
+
+    @background
+    def get_images(self, host: Host) -> bool:
+        images: list[Image] = host.client.images.list(all=False)  # type: ignore
+        changed = store.replace("images", keyed(images, host.tag), host.tag)
         self.images_count = len(self.images)
+        return changed
+
+    def on_image_event(self, host: Host, event: dict) -> None:
+        get = host.client.images.get
+        if apply_event(
+            store, "images", event, get, remove_actions=("delete",), host=host.tag
+        ):
+            self.images_count = len(self.images)
+
+    def on_containers_change(self) -> None:
+        self.usage_version += 1
+
+    async def watch_usage_version(self, version: int) -> None:
+        # Only the mounted widgets, the others are up to date when mounted
+        for widget in self.widgets.values():
+            if isinstance(widget, ImageWidget) and widget.mounted:
+                widget.update_usage()
+
+    def on_unmount(self):
+        self.app.docker_events.unsubscribe("image", self.on_image_event)
+        store.unsubscribe("containers", self.on_containers_change)
+        self.app.scheduler.remove("images")
+        executor.cancel(self)
 
     def on_hide(self):
-        self.get_images_timer.pause()
+        self.app.scheduler.set_visible("images", False)
 
     def on_show(self):
-        self.get_images_timer.resume()
+        self.app.scheduler.set_visible("images", True)
 
 
 class ImageWidget(Static):
@@ -47,26 +89,43 @@ class ImageWidget(Static):
         self.attrs = image.attrs or {}
         self.isize = self.attrs.get("Size", 0) / 1000000
         self.short_id = self.image.short_id.replace("sha256:", "")
+        self.tag = self.get_tag()
+        self.mounted = False
+        super().__init__(**kargs)
+
+    def get_tag(self) -> str:
+        name = ""
         if self.image.tags:
-            self.tag = self.image.tags[0]
+            name = self.image.tags[0]
         elif self.image.id:
-            self.tag = self.image.id.replace("sha256:", "")
-        else:
-            self.tag = ""
-        super().__init__(**kargs)
+            name = self.image.id.replace("sha256:", "")
+        host = host_of(self.image)
+        return name if host is None else f"{host}/{name}"
 
     def compose(self) -> ComposeResult:
         yield Vertical(
-            Label("[b]" + self.tag),
+            Label("[b]" + self.tag, classes="tag"),
             Label(self.short_id),
-            Label(f"Size: {self.isize:.2f}MB"),
+            Horizontal(
+                Label(f"Size: {self.isize:.2f}MB"),
+                Label("", classes="usage"),
+            ),
         )
 
-    def on_mount(self):
-        self.set_interval(2, self.update_usage)
+    def on_mount(self) -> None:
+        self.mounted = True
+        self.update_usage()
 
-    @daemon
-    def update_usage(self):
-        self.classes = (
-            "li running" if self.image.id in store.containers_images else "li"
-        )
+    def update_item(self, image: Image) -> None:
+        self.image = image
+        tag = self.get_tag()
+        if tag != self.tag:
+            self.tag = tag
+            self.query_one(".tag", Label).update("[b]" + self.tag)
+        if self.mounted:
+            self.update_usage()
+
+    def update_usage(self) -> None:
+        users = store.image_users(key(self.image))  # type: ignore
+        self.set_class(users > 0, "running")
+        self.query_one(".usage", Label).update(f" Containers: {users}")
@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import time
+from threading import Lock
+from typing import Callable, Iterator, Optional
+from docker import errors
+from docker.models.containers import Container
+from docker.types.daemon import CancellableStream
+
+from .utils import daemon, close_stream, parse_timestamp
+from .hosts import Host, fetch_all, tag
+
+# Seconds a line waits for older lines of other containers before being shown
+REORDER_WINDOW = 0.5
+# Lines waiting in the merge heap, older lines are dropped above this
+MAX_PENDING_LINES = 10000
+# Colors of the container name in front of each line
+PREFIX_COLORS = ["cyan", "magenta", "green", "yellow", "blue", "red"]
+
+# (unix time, container index, text)
+LogLine = tuple[float, int, bytes]
+
+
+def split_lines(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    partial = b""
+    for chunk in chunks:
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        yield from lines
+    if partial:
+        yield partial
+
+
+def parse_lines(lines: Iterator[bytes], index: int) -> Iterator[LogLine]:
+    # Lines of a `timestamps=True` log, without the timestamp
+    for line in lines:
+        timestamp, _, text = line.partition(b" ")
+        try:
+            yield (parse_timestamp(timestamp.decode()), index, text)
+        except ValueError:
+            continue
+
+
+def merge_logs(containers: list[Container], **kargs) -> Iterator[LogLine]:
+    """Logs of finished streams (follow=False) merged in timestamp order.
+
+    All the streams are open at the same time and read as the merge needs them,
+    so memory doesn't depend on the size of the logs."""
+    streams = [
+        parse_lines(
+            split_lines(c.logs(stream=True, follow=False, timestamps=True, **kargs)),
+            index,
+        )
+        for index, c in enumerate(containers)
+    ]
+    return heapq.merge(*streams)
+
+
+class LogMerger:
+    """Follows the logs of several containers merged in timestamp order.
+
+    Each line waits up to `window` seconds in a heap, so lines of different
+    containers arriving slightly out of order are shown in order."""
+
+    def __init__(
+        self,
+        containers: list[Container],
+        window: float = REORDER_WINDOW,
+        max_pending_lines: int = MAX_PENDING_LINES,
+        **kargs,
+    ):
+        self.containers = containers
+        self.window = window
+        self.max_pending_lines = max_pending_lines
+        self.kargs = kargs
+        # (unix time, sequence, arrival time, container index, text)
+        self.heap: list[tuple[float, int, float, int, bytes]] = []
+        self.sequence = itertools.count()
+        self.lock = Lock()
+        self.streams: list[CancellableStream] = []
+        self.running = False
+        self.dropped = 0
+        # Streams that ended, e.g. at `until` or when the container stopped
+        self.ended = 0
+
+    def start(self) -> None:
+        self.running = True
+        for index, container in enumerate(self.containers):
+            self.follow(index, container)
+
+    def stop(self) -> None:
+        self.running = False
+        with self.lock:
+            streams = list(self.streams)
+            self.streams.clear()
+        for stream in streams:
+            close_stream(stream)
+
+    @daemon
+    def follow(self, index: int, container: Container) -> None:
+        try:
+            self.read_lines(index, container)
+        finally:
+            with self.lock:
+                self.ended += 1
+
+    def read_lines(self, index: int, container: Container) -> None:
+        try:
+            stream: CancellableStream = container.logs(
+                stream=True, follow=True, timestamps=True, **self.kargs
+            )  # type: ignore
+        except errors.DockerException:
+            return None
+        with self.lock:
+            self.streams.append(stream)
+        if not self.running:
+            close_stream(stream)
+            return None
+        for unix_time, _, text in parse_lines(split_lines(stream), index):
+            with self.lock:
+                heapq.heappush(
+                    self.heap,
+                    (unix_time, next(self.sequence), time.time(), index, text),
+                )
+                if len(self.heap) > self.max_pending_lines:
+                    heapq.heappop(self.heap)
+                    self.dropped += 1
+
+    def finished(self) -> bool:
+        """True once every log ended."""
+        with self.lock:
+            return self.ended == len(self.containers)
+
+    def pop_ready(self, flush: bool = False) -> list[LogLine]:
+        """Lines that waited for the reorder window, in timestamp order."""
+        limit = time.time() - self.window
+        lines = []
+        with self.lock:
+            while self.heap and (flush or self.heap[0][2] <= limit):
+                unix_time, _, _, index, text = heapq.heappop(self.heap)
+                lines.append((unix_time, index, text))
+        return lines
+
+    def pop_dropped(self) -> int:
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+def find_containers(
+    hosts: list[Host],
+    names: tuple,
+    labels: tuple,
+    all: Optional[bool] = None,
+    on_error: Optional[Callable[[Host, Exception], None]] = None,
+) -> list[Container]:
+    """Containers by name or ID plus the ones matching all the labels, or all
+    of them (only the running ones if all is False), from all the hosts.
+
+    A name must exist in one of the hosts, the hosts that fail are passed to
+    on_error and skipped."""
+
+    def find(host: Host) -> tuple[list[Container], set[str]]:
+        client = host.client
+        containers: dict[str, Container] = {}
+        if all is not None:
+            for container in client.containers.list(all=all):
+                containers[container.id] = container  # type: ignore
+        found = set()
+        for name in names:
+            try:
+                container = client.containers.get(name)  # type: ignore
+            except errors.NotFound:
+                continue
+            containers[container.id] = container  # type: ignore
+            found.add(name)
+        if labels:
+            for container in client.containers.list(
+                all=True, filters={"label": list(labels)}
+            ):
+                containers[container.id] = container  # type: ignore
+        return [tag(c, host.tag) for c in containers.values()], found
+
+    containers: list[Container] = []
+    found: set[str] = set()
+    for host, result, error in fetch_all(hosts, find):
+        if result is None:
+            if on_error is None or len(hosts) == 1:
+                raise error  # type: ignore
+            on_error(host, error)  # type: ignore
+            continue
+        containers += result[0]
+        found |= result[1]
+    missing = [name for name in names if name not in found]
+    if missing:
+        message = f"No such container: {', '.join(missing)}"
+        raise errors.NotFound(message, explanation=message)
+    return containers
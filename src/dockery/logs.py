@@ -1,12 +1,25 @@
 import time
+from collections import Counter, deque
+from threading import Lock
+from typing import Any, Optional
+from rich.console import RenderableType
+from rich.style import Style
+from rich.text import Text
 from textual.app import ComposeResult
-from textual.widgets import Static, RichLog, Tabs
-from textual.reactive import reactive
-from textual.containers import VerticalScroll
+from textual.strip import Strip
+from textual.widgets import Static, RichLog, Tabs, Input, Label
+from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.events import Click
 from docker.models.containers import Container
+from docker.types.daemon import CancellableStream
 
 from .custom_widgets import CustomButton
-from .utils import daemon
+from .utils import daemon, parse_timestamp, close_stream
+from .models import HIGHLIGHT_MAX_RATE, log_store, store
+from .hosts import display_name, host_of
+from .logmerge import LogMerger, LogLine, PREFIX_COLORS
+from .search import LogSearch
+from .profiling import profiler
 
 
 class LogsButton(Static):
@@ -15,47 +28,300 @@ class LogsButton(Static):
         super().__init__(**kargs)
 
     def on_mount(self) -> None:
-        self.logs_container = self.app.query_one(
-            "VerticalScroll#container-logs", VerticalScroll
+        self.logs_container = self.screen.query_one(
+            "VerticalScroll#logs-view", VerticalScroll
         )
-        self.tabs = self.app.query_one("#nav", Tabs)
+        self.tabs = self.screen.query_one("#nav", Tabs)
 
-    async def on_click(self) -> None:
+    async def on_click(self, event: Click) -> None:
+        event.stop()
         await self.logs_container.remove_children()
-        lc = LogsContainer(self.container)
+        project = self.container.labels.get(COMPOSE_PROJECT_LABEL)
+        rate = self.app.highlight_max_rate  # type: ignore
+        if project and (event.ctrl or event.shift or event.meta):
+            # Modifier + click: merged logs of the whole compose project
+            containers = [
+                c
+                for c in store.containers.values()
+                if c.labels.get(COMPOSE_PROJECT_LABEL) == project
+                and host_of(c) == host_of(self.container)
+            ]
+            lc = MergedLogsContainer(containers, highlight_max_rate=rate)
+        else:
+            lc = LogsContainer(self.container, highlight_max_rate=rate)
         await self.logs_container.mount(lc)
+        self.screen.query_one(LogsView).clear_search()
         self.tabs.active = "container-logs"
 
     def compose(self) -> ComposeResult:
         yield CustomButton("Ξ Logs", color="blue")
 
 
-class LogsContainer(RichLog):
-    last_log = reactive("")
+# Flushes per second of the buffered lines to the view
+LOGS_FPS = 10
+# Lines waiting for the next flush, older lines are dropped above this
+MAX_PENDING_LINES = 10000
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
 
+
+class BufferedLog(RichLog):
+    """RichLog fed from other threads, written in batches at a capped rate."""
+
+    def __init__(
+        self,
+        fps: int = LOGS_FPS,
+        max_pending_lines: int = MAX_PENDING_LINES,
+        highlight_max_rate: int = HIGHLIGHT_MAX_RATE,
+        **kargs,
+    ):
+        self.fps = fps
+        self.highlight_max_rate = highlight_max_rate
+        self.pending: deque[Any] = deque(maxlen=max_pending_lines)
+        self.pending_lock = Lock()
+        self.dropped = 0
+        super().__init__(highlight=True, auto_scroll=True, wrap=True, **kargs)
+
+    def on_mount(self) -> None:
+        self.set_interval(1 / self.fps, self.flush_logs)
+
+    def add_lines(self, lines: list) -> None:
+        # Called from the stream thread
+        with self.pending_lock:
+            overflow = len(self.pending) + len(lines) - self.pending.maxlen  # type: ignore
+            if overflow > 0:
+                self.dropped += overflow
+            self.pending.extend(lines)
+
+    def flush_logs(self) -> None:
+        with self.pending_lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self.write(Text(f"[{dropped} lines dropped]", style="bold red"))
+        if not lines:
+            return None
+        line_rate = (len(lines) + dropped) * self.fps
+        self.highlight = line_rate <= self.highlight_max_rate
+        with profiler.timed("logs write"):
+            self.write(self.format_lines(lines))
+
+    def format_lines(self, lines: list) -> RenderableType:
+        return "\n".join(lines)
+
+
+class LogsContainer(BufferedLog):
     def __init__(self, container: Container, **kargs):
         self.container = container
-        super().__init__(highlight=True, auto_scroll=True, wrap=True, **kargs)
+        self.buffer = log_store.get(container.id, display_name(container))  # type: ignore
+        self.stream: CancellableStream | None = None
+        super().__init__(max_lines=self.buffer.max_lines, **kargs)
 
     def on_mount(self) -> None:
         self.running = True
         self.update_log()
 
-    async def watch_last_log(self, new_log: str):
-        self.write(new_log)
+    def add_log_lines(
+        self, lines: list[bytes], after: float = 0.0, seen: Optional[Counter] = None
+    ) -> None:
+        # Lines prefixed with their timestamp, older than `after` are skipped
+        # and so are the ones at `after` that are already buffered (seen)
+        text_lines = []
+        for line in lines:
+            timestamp, _, text = line.partition(b" ")
+            try:
+                unix_time = parse_timestamp(timestamp.decode())
+            except ValueError:
+                continue
+            if unix_time < after:
+                continue
+            if unix_time == after and seen and seen[text] > 0:
+                seen[text] -= 1
+                continue
+            self.buffer.append(unix_time, text)
+            text_lines.append(text.decode("utf-8", errors="ignore"))
+        self.add_lines(text_lines)
 
     @daemon
     def update_log(self) -> None:
-        # Get the last 40 logs(get all logs can be slow)
-        logs: bytes = self.container.logs(tail=40)
-        self.last_log = logs.decode("utf-8", errors="ignore")
-        # Start streaming logs(since last second)
-        for log in self.container.logs(stream=True, since=time.time() - 1):
-            if not self.running:
-                # Finish the thread after removing the widget
-                # TODO: it doesn't finish immediately? fix?
-                return None
-            self.last_log = log.decode("utf-8", errors="ignore")
+        buffered = self.buffer.snapshot()
+        if buffered:
+            # Recently viewed, show the buffer and fetch only the new lines
+            self.add_lines([t.decode("utf-8", errors="ignore") for _, t in buffered])
+        else:
+            # Get the last 40 logs(get all logs can be slow)
+            logs: bytes = self.container.logs(tail=40, timestamps=True)
+            self.add_log_lines(logs.split(b"\n"))
+        after = self.buffer.last_timestamp
+        seen = self.buffer.last_lines()
+        since = after or time.time() - 1
+        self.stream = self.container.logs(stream=True, timestamps=True, since=since)
+        if not self.running:
+            close_stream(self.stream)
+            return None
+        partial = b""
+        # Ends as soon as on_unmount closes the stream
+        for log in self.stream:
+            lines = (partial + log).split(b"\n")
+            partial = lines.pop()
+            self.add_log_lines(lines, after, seen)
 
     def on_unmount(self):
         self.running = False
+        if self.stream is not None:
+            close_stream(self.stream)
+
+
+class MergedLogsContainer(BufferedLog):
+    """Logs of several containers merged in timestamp order."""
+
+    def __init__(self, containers: list[Container], **kargs):
+        self.containers = containers
+        self.merger = LogMerger(containers, since=time.time() - 60)
+        width = max(len(display_name(c)) for c in containers)
+        self.prefixes = [
+            Text(
+                f"{display_name(c):<{width}} | ",
+                style=PREFIX_COLORS[i % len(PREFIX_COLORS)],
+            )
+            for i, c in enumerate(containers)
+        ]
+        super().__init__(max_lines=log_store.max_lines, **kargs)
+
+    def on_mount(self) -> None:
+        self.merger.start()
+
+    def flush_logs(self) -> None:
+        self.dropped += self.merger.pop_dropped()
+        self.add_lines(self.merger.pop_ready())
+        super().flush_logs()
+
+    def format_lines(self, lines: list[LogLine]) -> RenderableType:
+        texts = []
+        for _, index, line in lines:
+            text = Text(line.decode("utf-8", errors="ignore"))
+            if self.highlight:
+                self.highlighter.highlight(text)
+            texts.append(self.prefixes[index] + text)
+        return Text("\n").join(texts)
+
+    def on_unmount(self):
+        self.merger.stop()
+
+
+# Matches shown in the search results, the count includes the rest
+MAX_SEARCH_RESULTS = 5000
+# Seconds between searches of the new lines
+SEARCH_INTERVAL = 0.5
+MATCH_STYLE = "black on yellow"
+CURRENT_MATCH_STYLE = Style(reverse=True)
+
+
+class LogSearchResults(RichLog):
+    """Lines of all the buffered container logs matching the search."""
+
+    def __init__(self, **kargs):
+        self.search = LogSearch()
+        self.shown = 0
+        self.current = -1
+        super().__init__(highlight=False, auto_scroll=False, wrap=False, **kargs)
+
+    def set_query(self, query: str) -> None:
+        buffers = list(log_store.buffers.values())
+        self.search.set_query(query, buffers)
+        self.clear()
+        self.shown = 0
+        self.current = -1
+        self.write_matches(
+            [(b, n) for b in buffers for n in self.search.matches.get(b, [])]
+        )
+
+    def search_new_lines(self) -> None:
+        if self.search.pattern is not None:
+            self.write_matches(self.search.update(list(log_store.buffers.values())))
+
+    def write_matches(self, matches: list) -> None:
+        texts = []
+        for buffer, number in matches[: MAX_SEARCH_RESULTS - self.shown]:
+            line = buffer.line(number)
+            if line is None:
+                continue
+            text = Text(line)
+            for match in self.search.finditer(line):
+                text.stylize(MATCH_STYLE, match.start(), match.end())
+            texts.append(Text(f"{buffer.name} | ", style="cyan") + text)
+        if texts:
+            # One strip per match without wrapping, strip y is the match index
+            self.write(Text("\n").join(texts))
+            self.shown += len(texts)
+
+    def move(self, step: int) -> None:
+        if not self.shown:
+            return None
+        self.current = (self.current + step) % self.shown
+        self.scroll_to(y=max(0, self.current - self.size.height // 2), animate=False)
+        self.refresh()
+
+    def render_line(self, y: int) -> Strip:
+        strip = super().render_line(y)
+        if y + self.scroll_offset.y == self.current:
+            return strip.apply_style(CURRENT_MATCH_STYLE)
+        return strip
+
+
+class LogsView(Vertical):
+    BINDINGS = [
+        ("down", "move(1)", "Next match"),
+        ("up", "move(-1)", "Previous match"),
+    ]
+
+    def compose(self) -> ComposeResult:
+        with Horizontal(id="log-search-bar"):
+            yield Input(
+                placeholder="Search logs, /regex for a regular expression",
+                id="log-search",
+            )
+            yield Label("", id="log-search-status")
+        yield VerticalScroll(id="logs-view")
+        yield LogSearchResults(id="log-search-results")
+
+    def on_mount(self) -> None:
+        self.results = self.query_one(LogSearchResults)
+        self.status = self.query_one("#log-search-status", Label)
+        self.results.display = False
+        self.set_interval(SEARCH_INTERVAL, self.search_new_lines)
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        query = event.value
+        self.results.set_query(query)
+        searching = bool(query)
+        self.results.display = searching
+        self.query_one("#logs-view").display = not searching
+        self.update_status()
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self.action_move(1)
+
+    def search_new_lines(self) -> None:
+        if self.results.display:
+            self.results.search_new_lines()
+            self.update_status()
+
+    def focus_search(self) -> None:
+        self.query_one("#log-search", Input).focus()
+
+    def action_move(self, step: int) -> None:
+        self.results.move(step)
+        self.update_status()
+
+    def update_status(self) -> None:
+        search = self.results.search
+        if not search.query:
+            self.status.update("")
+        elif search.pattern is None:
+            self.status.update("invalid regex")
+        else:
+            self.status.update(f"{self.results.current + 1}/{search.count}")
+
+    def clear_search(self) -> None:
+        self.query_one("#log-search", Input).value = ""
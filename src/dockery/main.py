@@ -1,3 +1,11 @@
+import json
+import os
+import sys
+import time
+from threading import Lock
+from dataclasses import asdict
+from typing import Any, Callable, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
 import docker
 from docker import errors
 from docker.models.containers import Container
@@ -9,18 +17,137 @@ from docker.models.secrets import Secret
 import click
 from rich import print
 
-from .gui import AppGUI
-from .utils import var_dump
+# Keep these imports light, the interface and heavy output modules are
+# imported by the subcommands that need them
+from .utils import (
+    var_dump,
+    format_metric,
+    get_console,
+    executor,
+    parse_time,
+    format_timestamp,
+    open_logs_stream,
+    write_stream,
+    close_stream,
+    MAX_WORKERS,
+)
+from .models import (
+    HIGHLIGHT_MAX_RATE,
+    LOG_MAX_BYTES,
+    LOG_MAX_LINES,
+    StatsSample,
+    log_store,
+    store,
+)
+from .stats import StatsHandler, StatsService
+from .events import DockerEvents
+from .logmerge import LogLine, LogMerger, PREFIX_COLORS, find_containers, merge_logs
+from .export import COMPRESSIONS, export_logs
+from .snapshot import load_snapshot
+from .hosts import (
+    DEFAULT_TIMEOUT,
+    Host,
+    connect,
+    display_name,
+    fetch_all,
+    host_of,
+    tag,
+)
+from .fleet import METRICS as FLEET_METRICS, FleetSampler, FleetStats
+from .actions import ACTIONS, MAX_PARALLEL_ACTIONS, ActionRunner, action_runner
+from .profiling import profiler
+
+
+def start_profile(ctx: click.Context, param: click.Parameter, value) -> None:
+    if not value:
+        return None
+    if param.name == "profile_output":
+        profiler.start_cprofile(value)
+    # Once, even with the options of the group and the subcommand
+    if not ctx.meta.get("profile"):
+        ctx.meta["profile"] = True
+        ctx.call_on_close(profiler.finish)
+
 
 default_options = [
     click.option(
         "--server",
-        default=None,
-        help="Docker server url, for example: unix:///var/run/docker.sock",
+        multiple=True,
+        help="Docker server url, for example: unix:///var/run/docker.sock, "
+        "repeat it to use several servers",
+    ),
+    click.option(
+        "--hosts-file",
+        type=click.Path(exists=True, dir_okay=False),
+        help="File with a server url per line, optionally preceded by a name",
     ),
     click.option("--ssh", is_flag=True),
+    click.option(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Seconds to wait for each response of a server",
+    ),
     click.option("--api-version", default="1.35", help="Docker API version"),
-    click.option("--format", "-f", default="yaml", help="Output format"),
+    click.option(
+        "--format",
+        "-f",
+        default="yaml",
+        type=click.Choice(["yaml", "json", "ndjson"]),
+        help="Output format, ndjson streams one object per line",
+    ),
+    click.option(
+        "--profile",
+        is_flag=True,
+        expose_value=False,
+        callback=start_profile,
+        help="Print the Docker API calls, threads and timings on exit",
+    ),
+    click.option(
+        "--profile-output",
+        type=click.Path(dir_okay=False),
+        expose_value=False,
+        callback=start_profile,
+        help="Also save a cProfile of the main thread in this file",
+    ),
+]
+
+
+def parse_filters(ctx, param, value: tuple) -> Optional[dict[str, list[str]]]:
+    filters: dict[str, list[str]] = {}
+    for item in value:
+        name, equal, filter_value = item.partition("=")
+        if not name or not equal:
+            raise click.BadParameter(
+                f"{item!r}, use key=value, e.g. status=running or label=app=web"
+            )
+        filters.setdefault(name, []).append(filter_value)
+    return filters or None
+
+
+def parse_fields(ctx, param, value: Optional[str]) -> Optional[list[str]]:
+    if value is None:
+        return None
+    return [f.strip() for f in value.split(",") if f.strip()]
+
+
+# For the commands that list objects, the filters are applied by the daemon
+list_options = [
+    click.option(
+        "--filter",
+        "filters",
+        multiple=True,
+        callback=parse_filters,
+        help="Docker API filter as key=value, e.g. label=app=web, "
+        "repeat it to combine several",
+    ),
+    click.option(
+        "--fields",
+        callback=parse_fields,
+        help="Comma separated keys shown of each object, nested keys with dots, "
+        "e.g. Id,State.Status",
+    ),
+    click.option("--quiet", "-q", is_flag=True, help="Only show the IDs"),
 ]
 
 
@@ -33,26 +160,140 @@ def add_options(options):
     return _add_options
 
 
-def get_client(server, ssh, api_version, **kargs):
-    if server is None:
-        client = docker.from_env()
+def get_hosts(server, hosts_file, ssh, api_version, timeout, **kargs) -> list[Host]:
+    try:
+        return connect(server, hosts_file, ssh, api_version, timeout)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="--hosts-file")
+
+
+def report_error(host: Host, error: Exception) -> None:
+    click.echo(f"{host.name}: {error}", err=True)
+
+
+def dump_from_hosts(
+    hosts: list[Host],
+    fetch: Callable[[docker.DockerClient], Iterable],
+    format: str,
+    only: Optional[str] = None,
+) -> None:
+    """Objects of all the hosts, fetched at the same time.
+
+    With several hosts each object gets the name of its host in "Host" and a
+    host that fails is reported without stopping the others. With `only`,
+    that key of each object is printed, one per line."""
+    failed = []
+
+    def objects():
+        if len(hosts) == 1:
+            try:
+                yield from fetch(hosts[0].client)
+            except errors.APIError as error:
+                # e.g. an invalid filter, reported like with several hosts
+                failed.append(hosts[0])
+                report_error(hosts[0], error)
+            return None
+        for host, result, error in fetch_all(hosts, lambda h: list(fetch(h.client))):
+            if error is not None:
+                failed.append(host)
+                report_error(host, error)
+                continue
+            for obj in result:  # type: ignore
+                yield {"Host": host.name, **obj}
+
+    if only is not None:
+        for obj in objects():
+            click.echo(obj[only])
     else:
-        client = docker.DockerClient(
-            base_url=server, version=api_version, use_ssh_client=ssh
-        )
-    return client
+        var_dump(objects(), format)
+    if failed:
+        sys.exit(1)
+
+
+def get_field(obj: Any, path: str) -> Any:
+    for name in path.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(name)
+    return obj
+
+
+def dump_list(
+    kargs: dict,
+    fetch: Callable[[docker.DockerClient, Optional[dict]], Iterable[dict]],
+    id_key: str,
+) -> None:
+    """The objects of a list command with its --filter, --fields and --quiet."""
+    fields = [id_key] if kargs["quiet"] else kargs["fields"]
+
+    def fetch_fields(client: docker.DockerClient) -> Iterable[dict]:
+        objects = fetch(client, kargs["filters"])
+        if fields is None:
+            return objects
+        return ({f: get_field(obj, f) for f in fields} for obj in objects)
+
+    dump_from_hosts(
+        get_hosts(**kargs),
+        fetch_fields,
+        kargs["format"],
+        only=id_key if kargs["quiet"] else None,
+    )
 
 
 def run_gui(**kargs):
-    client = get_client(**kargs)
-    gui = AppGUI(client)
+    from .gui import AppGUI
+
+    hosts = get_hosts(**kargs)
+    # The refreshes of a slow host shouldn't wait for the threads of another
+    executor.set_max_workers(kargs["workers"] * len(hosts))
+    if kargs["snapshot"]:
+        for host in hosts:
+            load_snapshot(host, store)
+    gui = AppGUI(
+        hosts,
+        snapshot=kargs["snapshot"],
+        highlight_max_rate=kargs["log_highlight_rate"],
+    )
     gui.run()
 
 
 @click.group(invoke_without_command=True)
 @add_options(default_options)
+@click.option(
+    "--workers",
+    default=MAX_WORKERS,
+    help="Max threads used for background refreshes in the interface, per server",
+)
+@click.option(
+    "--log-lines",
+    default=LOG_MAX_LINES,
+    help="Log lines kept for each of the recently viewed containers",
+)
+@click.option(
+    "--log-bytes",
+    default=LOG_MAX_BYTES,
+    help="Max size in bytes of the logs kept for each container",
+)
+@click.option(
+    "--log-highlight-rate",
+    default=HIGHLIGHT_MAX_RATE,
+    help="Lines per second above which the logs in the interface aren't highlighted",
+)
+@click.option(
+    "--parallel-actions",
+    default=MAX_PARALLEL_ACTIONS,
+    help="Max containers started, stopped or restarted at the same time",
+)
+@click.option(
+    "--snapshot/--no-snapshot",
+    default=True,
+    help="Show the lists saved on the last exit while they are refreshed",
+)
 @click.pass_context
 def main(ctx, **kargs):
+    executor.set_max_workers(kargs["workers"])
+    action_runner.set_max_workers(kargs["parallel_actions"])
+    log_store.configure(kargs["log_lines"], kargs["log_bytes"])
     if ctx.invoked_subcommand is None:
         run_gui(**kargs)
 
@@ -60,102 +301,588 @@ def main(ctx, **kargs):
 @click.command
 @add_options(default_options)
 def df(**kargs):
-    client = get_client(**kargs)
-    var_dump(client.df(), kargs["format"])
+    hosts = get_hosts(**kargs)
+    if len(hosts) == 1:
+        var_dump(hosts[0].client.df(), kargs["format"])
+    else:
+        dump_from_hosts(hosts, lambda client: [client.df()], kargs["format"])
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
 def volumes(**kargs):
-    client = get_client(**kargs)
-    vlms: list[Volume] = client.volumes.list()  # type: ignore
-    vlm_list = list(map(lambda x: x.attrs, vlms))
-    var_dump(vlm_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        vlms: list[Volume] = client.volumes.list(filters=filters)  # type: ignore
+        return map(lambda x: x.attrs, vlms)
+
+    dump_list(kargs, fetch, "Name")
+
+
+def inspect_containers(
+    client: docker.DockerClient, all: bool, filters: Optional[dict] = None
+):
+    # Same data as containers.list(), but yielded as each one is inspected
+    for c in client.api.containers(all=all, filters=filters):
+        try:
+            yield client.api.inspect_container(c["Id"])
+        except errors.NotFound:
+            continue  # removed in the meantime
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
 @click.option("--all", "-a", is_flag=True)
+@click.option(
+    "--inspect",
+    is_flag=True,
+    help="Full details of each container, one more request per container",
+)
 def ps(**kargs):
-    client = get_client(**kargs)
-    containers: list[Container] = client.containers.list(
-        all=kargs["all"]
-    )  # type: ignore
-    con_list = list(map(lambda x: x.attrs, containers))
-    var_dump(con_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        if kargs["inspect"]:
+            return inspect_containers(client, kargs["all"], filters)
+        # The summaries of the list response, in a single request
+        return client.api.containers(all=kargs["all"], filters=filters)
+
+    dump_list(kargs, fetch, "Id")
+
+
+def stats_table(containers: list[Container], samples: dict[str, StatsSample]):
+    from rich.table import Table
+
+    table = Table("ID", "NAME", "CPU %", "MEM", "MEM %")
+    for c in containers:
+        sample = samples.get(c.id)  # type: ignore
+        if sample is None:
+            table.add_row(c.short_id, display_name(c), "-", "-", "-")
+        else:
+            table.add_row(
+                c.short_id,
+                display_name(c),
+                f"{sample.cpu:.1f}",
+                f"{sample.mem:.1f}MB",
+                f"{sample.mem_percent:.1f}",
+            )
+    return table
+
+
+def watch_stats(hosts: list[Host], interval: float, format: str):
+    from rich.live import Live
+
+    lock = Lock()
+    containers: dict[str, Container] = {}
+    handlers: dict[str, StatsHandler] = {}
+    samples: dict[str, StatsSample] = {}
+    service = StatsService(max_streams=1)
+
+    def add(container: Container) -> None:
+        def handler(sample: StatsSample):
+            samples[container.id] = sample  # type: ignore
+
+        with lock:
+            if container.id in containers:
+                return None
+            containers[container.id] = container  # type: ignore
+            handlers[container.id] = handler  # type: ignore
+            # One stream per running container
+            service.max_streams = max(service.max_streams, len(containers))
+        service.subscribe(container, handler)
+
+    def remove(container_id: str) -> None:
+        with lock:
+            containers.pop(container_id, None)
+            handler = handlers.pop(container_id, None)
+        if handler is not None:
+            service.unsubscribe(container_id, handler)
+        samples.pop(container_id, None)
+
+    def on_event(host: Host, event: dict) -> None:
+        container_id = event.get("Actor", {}).get("ID", "")
+        if event.get("Action") == "start":
+            try:
+                container = host.client.containers.get(container_id)  # type: ignore
+            except errors.NotFound:
+                return None
+            add(tag(container, host.tag))
+        elif event.get("Action") == "die":
+            remove(container_id)
+
+    # Listened before the first list, the containers started later are added
+    # and the stopped ones removed
+    docker_events = DockerEvents(hosts)
+    docker_events.subscribe("container", on_event)
+    docker_events.start()
+    for c in find_containers(hosts, (), (), all=False, on_error=report_error):
+        add(c)
+
+    def running() -> list[Container]:
+        with lock:
+            return list(containers.values())
+
+    try:
+        if format in ("json", "ndjson"):
+            while True:
+                time.sleep(interval)
+                for c in running():
+                    sample = samples.get(c.id)  # type: ignore
+                    if sample is not None:
+                        line = {"id": c.id, "name": c.name, "time": time.time()}
+                        if host_of(c) is not None:
+                            line["host"] = host_of(c)
+                        line.update(asdict(sample))
+                        click.echo(json.dumps(line))
+        else:
+            with Live(stats_table(running(), samples), auto_refresh=False) as live:
+                while True:
+                    time.sleep(interval)
+                    live.update(stats_table(running(), samples), refresh=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        docker_events.stop()
+        service.stop()
 
 
 @click.command
 @add_options(default_options)
+@click.option("--parallel", "-p", default=8, help="Containers fetched at the same time")
+@click.option("--watch", "-w", is_flag=True, help="Stream stats of running containers")
+@click.option("--interval", default=2.0, help="Refresh interval of --watch in seconds")
 def stats(**kargs):
-    client = get_client(**kargs)
-    containers: list[Container] = client.containers.list(all=True)  # type: ignore
-    stats = list(map(lambda x: x.stats(stream=False), containers))
-    var_dump(stats, kargs["format"])
+    hosts = get_hosts(**kargs)
+    if kargs["watch"]:
+        watch_stats(hosts, kargs["interval"], kargs["format"])
+        return None
+
+    def fetch(client: docker.DockerClient):
+        containers: list[Container] = client.containers.list(all=True)  # type: ignore
+        # Each call waits for the daemon to collect a second sample
+        with ThreadPoolExecutor(kargs["parallel"]) as pool:
+            yield from pool.map(lambda x: x.stats(stream=False), containers)
+
+    dump_from_hosts(hosts, fetch, kargs["format"])
+
+
+# Seconds top waits for the first samples of the streams it opens
+STREAM_WAIT = 5.0
+TOP_COLUMNS = (
+    "NAME",
+    "CPU %",
+    "MEM",
+    "MEM %",
+    "NET RX",
+    "NET TX",
+    "BLK READ",
+    "BLK WRITE",
+)
+
+
+def top_table(fleet: FleetStats, positions: list[int]):
+    from rich.table import Table
+
+    table = Table(*TOP_COLUMNS)
+    for position in positions:
+        row = fleet.row(position)
+        table.add_row(row["name"], *(format_metric(m, row[m]) for m in FLEET_METRICS))
+    # Totals of each host below the containers
+    table.add_section()
+    for host, total in fleet.totals().items():
+        usage = [
+            format_metric(m, total[m]) if m in total else "" for m in FLEET_METRICS
+        ]
+        table.add_row(
+            f"{host or 'TOTAL'} ({total['containers']})", *usage, style="bold"
+        )
+    return table
+
+
+@click.command
+@add_options(default_options)
+@click.option(
+    "--sort", "-s", default="cpu", type=click.Choice(FLEET_METRICS), help="Sort by"
+)
+@click.option("--limit", "-n", default=20, help="Containers shown, 0 for all")
+@click.option(
+    "--interval",
+    default=2.0,
+    help="Seconds between the samples the rates are computed from",
+)
+@click.option("--watch", "-w", is_flag=True, help="Refresh every --interval seconds")
+@click.option(
+    "--parallel", "-p", default=16, help="Containers fetched at the same time"
+)
+def top(**kargs):
+    from rich.live import Live
+
+    hosts = get_hosts(**kargs)
+    containers = find_containers(hosts, (), (), all=False, on_error=report_error)
+    fleet = FleetStats()
+    limit, format = kargs["limit"] or None, kargs["format"]
+
+    def report() -> dict:
+        return {
+            "hosts": [
+                {"host": h, **t} if h is not None else t
+                for h, t in fleet.totals().items()
+            ],
+            "containers": [fleet.row(p) for p in fleet.top(kargs["sort"], limit)],
+        }
+
+    with ThreadPoolExecutor(kargs["parallel"]) as pool:
+        sampler = FleetSampler(pool)
+        try:
+            # The rates need two samples
+            fleet.update(sampler.fetch(containers))
+            if sampler.wait_streams(STREAM_WAIT):
+                # Streamed without one-shot, the first samples came only now
+                fleet.update(sampler.fetch(containers))
+            time.sleep(kargs["interval"])
+            fleet.update(sampler.fetch(containers))
+            if not kargs["watch"]:
+                if format in ("json", "ndjson"):
+                    var_dump(report(), format)
+                else:
+                    positions = fleet.top(kargs["sort"], limit)
+                    get_console().print(top_table(fleet, positions))
+                return None
+            if format in ("json", "ndjson"):
+                while True:
+                    line = {"time": time.time(), **report()}
+                    click.echo(json.dumps(line))
+                    time.sleep(kargs["interval"])
+                    fleet.update(sampler.fetch(containers))
+            table = top_table(fleet, fleet.top(kargs["sort"], limit))
+            with Live(table, auto_refresh=False) as live:
+                while True:
+                    time.sleep(kargs["interval"])
+                    fleet.update(sampler.fetch(containers))
+                    positions = fleet.top(kargs["sort"], limit)
+                    live.update(top_table(fleet, positions), refresh=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sampler.stop()
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
+@click.option(
+    "--inspect",
+    is_flag=True,
+    help="Full details of each image, one more request per image",
+)
 def images(**kargs):
-    client = get_client(**kargs)
-    imgs: list[Image] = client.images.list()  # type: ignore
-    img_list = list(map(lambda x: x.attrs, imgs))
-    var_dump(img_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        if not kargs["inspect"]:
+            return client.api.images(filters=filters)
+        imgs: list[Image] = client.images.list(filters=filters)  # type: ignore
+        return map(lambda x: x.attrs, imgs)
+
+    dump_list(kargs, fetch, "Id")
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
 def networks(**kargs):
-    client = get_client(**kargs)
-    netw: list[Network] = client.networks.list()  # type: ignore
-    net_list = list(map(lambda x: x.attrs, netw))
-    var_dump(net_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        netw: list[Network] = client.networks.list(filters=filters)  # type: ignore
+        return map(lambda x: x.attrs, netw)
+
+    dump_list(kargs, fetch, "Id")
+
+
+def parse_time_option(ctx, param, value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return parse_time(value)
+    except ValueError:
+        raise click.BadParameter(
+            "use a unix time, a date like 2023-07-01T12:00:00Z or a duration like 42m"
+        )
+
+
+def print_merged_logs(
+    containers: list[Container],
+    follow: bool,
+    tail: Optional[int],
+    since: Optional[float],
+    until: Optional[float],
+    timestamps: bool,
+):
+    width = max(len(display_name(c)) for c in containers)
+    prefixes = [
+        click.style(
+            f"{display_name(c):<{width}} | ", fg=PREFIX_COLORS[i % len(PREFIX_COLORS)]
+        )
+        for i, c in enumerate(containers)
+    ]
+
+    def echo(lines: Iterable[LogLine]):
+        for unix_time, index, text in lines:
+            line = text.decode("utf-8", errors="ignore")
+            if timestamps:
+                line = format_timestamp(unix_time) + " " + line
+            click.echo(prefixes[index] + line)
+
+    start = time.time()
+    # The history first, then the new lines from all the containers
+    history_until = min(until or start, start)
+    echo(
+        merge_logs(
+            containers,
+            tail="all" if tail is None else tail,
+            since=since,
+            until=history_until,
+        )
+    )
+    if not follow or (until is not None and until <= start):
+        return None
+    merger = LogMerger(containers, since=start, until=until)
+    merger.start()
+    try:
+        while not merger.finished():
+            time.sleep(0.1)
+            echo(merger.pop_ready())
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        merger.stop()
+        # The lines still waiting in the reorder window
+        echo(merger.pop_ready(flush=True))
+
+
+def write_logs(
+    container: Container,
+    follow: bool,
+    tail: Optional[int],
+    since: Optional[float],
+    until: Optional[float],
+    timestamps: bool,
+):
+    # Raw bytes, written as fast as the pipe takes them and in constant memory
+    start = time.time()
+    history_until = min(until or start, start) if follow else until
+    stream = open_logs_stream(
+        container, tail=tail, since=since, until=history_until, timestamps=timestamps
+    )
+    write_stream(stream)
+    if not follow or (until is not None and until <= start):
+        return None
+    stream = open_logs_stream(
+        container, follow=True, since=start, until=until, timestamps=timestamps
+    )
+    try:
+        write_stream(stream, live=True)
+    finally:
+        close_stream(stream)
+
+
+def export_all(
+    containers: list[Container],
+    directory: str,
+    compression: str,
+    parallel: int,
+    format: str,
+):
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise click.UsageError("zstd needs zstandard: pip install dockery[zstd]")
+    failed = []
+
+    def report(results):
+        for result in results:
+            if "error" in result:
+                failed.append(result)
+            yield result
+
+    with ThreadPoolExecutor(parallel) as pool:
+        results = pool.map(lambda c: export_logs(c, directory, compression), containers)
+        var_dump(report(results), format)
+    if failed:
+        sys.exit(1)
 
 
 @click.command
 @add_options(default_options)
-@click.argument("container")
-@click.option("--stream", is_flag=True)
+@click.argument("containers", nargs=-1)
+@click.option(
+    "--label",
+    "-l",
+    multiple=True,
+    help="Show the logs of the containers with this label (key or key=value)",
+)
+@click.option("--stream", is_flag=True, help="Follow the logs")
+@click.option(
+    "--tail",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Number of lines to show from the end of the logs",
+)
+@click.option(
+    "--since",
+    callback=parse_time_option,
+    help="Show the logs since a timestamp (2023-07-01T12:00:00Z) or duration (42m)",
+)
+@click.option(
+    "--until",
+    callback=parse_time_option,
+    help="Show the logs before a timestamp (2023-07-01T12:00:00Z) or duration (42m)",
+)
+@click.option("--timestamps", "-t", is_flag=True, help="Show timestamps")
+@click.option(
+    "--export",
+    type=click.Path(file_okay=False),
+    help="Save the new logs of the containers (all by default) in this directory",
+)
+@click.option(
+    "--compression",
+    default="gzip",
+    type=click.Choice(list(COMPRESSIONS)),
+    help="Compression of the exported logs, zstd needs dockery[zstd]",
+)
+@click.option(
+    "--parallel", "-p", default=4, help="Containers exported at the same time"
+)
 def logs(**kargs):
-    client = get_client(**kargs)
+    hosts = get_hosts(**kargs)
+    names, labels = kargs["containers"], kargs["label"]
+    # Without names or labels all the containers are exported
+    export_all_containers = kargs["export"] and not names and not labels
     try:
-        container: Container = client.containers.get(kargs["container"])  # type: ignore
-    except errors.NotFound:
-        print(f"Container [b]{kargs['container']}[/] not found")
-    else:
-        if kargs["stream"]:
-            for log in container.logs(stream=True):
-                print(log.decode("utf-8", errors="ignore"), end="")
+        containers = find_containers(
+            hosts,
+            names,
+            labels,
+            all=True if export_all_containers else None,
+            on_error=report_error,
+        )
+    except errors.NotFound as error:
+        print(error.explanation)
+        return None
+    if kargs["export"]:
+        export_all(
+            containers,
+            kargs["export"],
+            kargs["compression"],
+            kargs["parallel"],
+            kargs["format"],
+        )
+        return None
+    options = {k: kargs[k] for k in ("tail", "since", "until", "timestamps")}
+    try:
+        if len(containers) == 0:
+            print("No containers found")
+        elif len(containers) > 1:
+            print_merged_logs(containers, kargs["stream"], **options)
         else:
-            logs: bytes = container.logs()
-            print(logs.decode("utf-8", errors="ignore"))
+            write_logs(containers[0], kargs["stream"], **options)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # The reader is gone (| head), don't complain when stdout is flushed at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def container_action(action: str):
+    @click.command(name=action, help=f"{action.capitalize()} containers")
+    @add_options(default_options)
+    @click.argument("containers", nargs=-1)
+    @click.option(
+        "--label",
+        "-l",
+        multiple=True,
+        help="Containers with this label (key or key=value)",
+    )
+    @click.option(
+        "--all",
+        "-a",
+        is_flag=True,
+        help="All the containers, only the running ones to stop or restart",
+    )
+    @click.option(
+        "--parallel",
+        "-p",
+        default=MAX_PARALLEL_ACTIONS,
+        help="Containers acted on at the same time",
+    )
+    def command(**kargs):
+        unreachable = []
+
+        def on_error(host: Host, error: Exception) -> None:
+            report_error(host, error)
+            unreachable.append(host)
+
+        try:
+            containers = find_containers(
+                get_hosts(**kargs),
+                kargs["containers"],
+                kargs["label"],
+                all=action == "start" if kargs["all"] else None,
+                on_error=on_error,
+            )
+        except errors.NotFound as error:
+            print(error.explanation)
+            sys.exit(1)
+        if not containers:
+            print("No containers found")
+            return None
+        failed = []
+
+        def report(results):
+            # One result per container, as soon as it's done
+            for result in results:
+                if not result.ok:
+                    failed.append(result)
+                yield asdict(result)
+
+        runner = ActionRunner(kargs["parallel"])
+        var_dump(report(runner.run_all(containers, action)), kargs["format"])
+        if failed or unreachable:
+            sys.exit(1)
+
+    return command
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
 def configs(**kargs):
-    client = get_client(**kargs)
-    conf: list[Config] = client.configs.list()  # type: ignore
-    conf_list = list(map(lambda x: x.attrs, conf))
-    var_dump(conf_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        conf: list[Config] = client.configs.list(filters=filters)  # type: ignore
+        return map(lambda x: x.attrs, conf)
+
+    dump_list(kargs, fetch, "ID")
 
 
 @click.command
 @add_options(default_options)
+@add_options(list_options)
 def secrets(**kargs):
-    client = get_client(**kargs)
-    secr: list[Secret] = client.secrets.list()  # type: ignore
-    secr_list = list(map(lambda x: x.attrs, secr))
-    var_dump(secr_list, kargs["format"])
+    def fetch(client: docker.DockerClient, filters: Optional[dict]):
+        secr: list[Secret] = client.secrets.list(filters=filters)  # type: ignore
+        return map(lambda x: x.attrs, secr)
+
+    dump_list(kargs, fetch, "ID")
 
 
 main.add_command(df)
 main.add_command(volumes)
 main.add_command(ps)
 main.add_command(stats)
+main.add_command(top)
 main.add_command(images)
 main.add_command(networks)
 main.add_command(logs)
+for action in ACTIONS:
+    main.add_command(container_action(action))
 main.add_command(configs)
 main.add_command(secrets)
 
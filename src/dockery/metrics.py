@@ -0,0 +1,127 @@
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from .models import StatsSample
+
+METRICS = ("cpu", "mem", "net_rx", "net_tx", "blk_read", "blk_write")
+METRIC_NAMES = {
+    "cpu": "CPU",
+    "mem": "Memory",
+    "net_rx": "Network in",
+    "net_tx": "Network out",
+    "blk_read": "Disk read",
+    "blk_write": "Disk write",
+}
+# Last minute at 1s for the cards, last 2 hours at 20s for the detail view,
+# 6 * (60 + 360) float32 = ~10KB of samples per container, ~4MB for all
+RECENT_SAMPLES = 60
+RECENT_STEP = 1.0
+HISTORY_SAMPLES = 360
+HISTORY_STEP = 20.0
+HISTORY_MAX_CONTAINERS = 300
+
+
+class MetricsRing:
+    """One value per metric every `step` seconds in fixed float32 arrays.
+
+    Samples in the same step keep the highest value, so a short spike is
+    still seen at a coarse step. Steps without samples are 0."""
+
+    def __init__(self, size: int, step: float):
+        self.size = size
+        self.step = step
+        self.series = {m: array("f", bytes(4 * size)) for m in METRICS}
+        # Step number of the newest value and number of valid values
+        self.slot: Optional[int] = None
+        self.count = 0
+
+    def add(self, values: dict[str, float], now: float) -> None:
+        slot = int(now // self.step)
+        if self.slot is None or slot - self.slot >= self.size:
+            for series in self.series.values():
+                series[:] = array("f", bytes(4 * self.size))
+            self.slot, self.count = slot, 1
+        elif slot > self.slot:
+            for s in range(self.slot + 1, slot + 1):
+                for series in self.series.values():
+                    series[s % self.size] = 0.0
+            self.count = min(self.size, self.count + slot - self.slot)
+            self.slot = slot
+        i = self.slot % self.size
+        for metric, series in self.series.items():
+            series[i] = max(series[i], values[metric])
+
+    def values(self, metric: str) -> array:
+        """Oldest to newest."""
+        if self.slot is None:
+            return array("f")
+        series = self.series[metric]
+        start = (self.slot + 1) % self.size
+        ordered = series[start:] + series[:start]
+        return ordered[self.size - self.count :]
+
+
+class MetricsHistory:
+    """CPU %, memory in MB and I/O rates in bytes/s of a container."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.recent = MetricsRing(RECENT_SAMPLES, RECENT_STEP)
+        self.history = MetricsRing(HISTORY_SAMPLES, HISTORY_STEP)
+        self.last: Optional[StatsSample] = None
+        self.last_time = 0.0
+        self.rates = {"net_rx": 0.0, "net_tx": 0.0, "blk_read": 0.0, "blk_write": 0.0}
+
+    def record(self, sample: StatsSample, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self.lock:
+            last, elapsed = self.last, now - self.last_time
+            for metric in self.rates:
+                total = getattr(sample, metric)
+                previous = getattr(last, metric) if last is not None else total
+                # A restarted container starts its totals again from 0
+                delta = total - previous if total >= previous else 0
+                self.rates[metric] = delta / elapsed if elapsed > 0 else 0.0
+            self.last, self.last_time = sample, now
+            values = {"cpu": sample.cpu, "mem": sample.mem, **self.rates}
+            self.recent.add(values, now)
+            self.history.add(values, now)
+
+    def values(self, metric: str, recent: bool = True) -> array:
+        with self.lock:
+            return (self.recent if recent else self.history).values(metric)
+
+    def latest(self, metric: str) -> float:
+        with self.lock:
+            if self.last is None:
+                return 0.0
+            if metric in self.rates:
+                return self.rates[metric]
+            return getattr(self.last, metric)
+
+
+class MetricsStore:
+    """Histories of the last containers with stats, by store key."""
+
+    def __init__(self, max_containers: int = HISTORY_MAX_CONTAINERS):
+        self.max_containers = max_containers
+        self.lock = Lock()
+        self.histories: OrderedDict[str, MetricsHistory] = OrderedDict()
+
+    def record(self, container_key: str, sample: StatsSample) -> None:
+        with self.lock:
+            history = self.histories.pop(container_key, None) or MetricsHistory()
+            self.histories[container_key] = history
+            while len(self.histories) > self.max_containers:
+                self.histories.popitem(last=False)
+        history.record(sample)
+
+    def get(self, container_key: str) -> Optional[MetricsHistory]:
+        with self.lock:
+            return self.histories.get(container_key)
+
+
+metrics_store = MetricsStore()
@@ -1,9 +1,287 @@
+import re
+from collections import Counter, OrderedDict, defaultdict, deque
 from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Literal, Optional
+
+from .search import LogIndex
+from .hosts import host_key, host_of, key
+
+# Default scrollback of each container and number of containers kept
+LOG_MAX_LINES = 10000
+LOG_MAX_BYTES = 4 * 1024 * 1024
+LOG_MAX_CONTAINERS = 10
+# Lines per second above which the logs view stops highlighting
+HIGHLIGHT_MAX_RATE = 200
 
 
 @dataclass
+class StatsSample:
+    cpu: float
+    mem: float
+    mem_percent: float
+    # Totals in bytes since the container started
+    net_rx: int = 0
+    net_tx: int = 0
+    blk_read: int = 0
+    blk_write: int = 0
+
+
+Kind = Literal["containers", "images", "networks", "volumes"]
+
+
+def container_refs(container: Any) -> tuple[str, tuple, tuple]:
+    # Keys of the image, networks and volumes used by a container
+    attrs = container.attrs or {}
+    host = host_of(container)
+    networks = ((attrs.get("NetworkSettings") or {}).get("Networks") or {}).values()
+    return (
+        # Sparse listings have the image name in Image
+        host_key(host, attrs.get("ImageID") or attrs.get("Image") or ""),
+        tuple(host_key(host, n["NetworkID"]) for n in networks if n.get("NetworkID")),
+        tuple(
+            host_key(host, m["Name"])
+            for m in attrs.get("Mounts") or []
+            if m.get("Type") == "volume" and m.get("Name")
+        ),
+    )
+
+
+def add_refs(indexes: tuple, container_id: str, refs: tuple) -> None:
+    image, networks, volumes = refs
+    for index, keys in zip(indexes, ((image,), networks, volumes)):
+        for ref in keys:
+            index[ref].add(container_id)
+
+
 class Store:
-    containers_images: list
+    """Containers, images, networks and volumes keyed by ID, shared by all the
+    tabs, with the containers using each image, network and volume.
+
+    With several hosts the keys are "host/ID" and each host is replaced on
+    its own, see hosts.key().
+
+    The reverse indexes are updated with each container change, so looking up
+    the users of an object is a dict access."""
+
+    def __init__(self):
+        self.containers: dict[str, Any] = {}
+        self.images: dict[str, Any] = {}
+        self.networks: dict[str, Any] = {}
+        self.volumes: dict[str, Any] = {}
+        self.image_containers: defaultdict[str, set[str]] = defaultdict(set)
+        self.network_containers: defaultdict[str, set[str]] = defaultdict(set)
+        self.volume_containers: defaultdict[str, set[str]] = defaultdict(set)
+        # What each container was indexed under, to unindex it
+        self.refs: dict[str, tuple[str, tuple, tuple]] = {}
+        # (kind, host) loaded from a snapshot and not refreshed from the daemon yet
+        self.stale: set[tuple[str, Optional[str]]] = set()
+        self.listeners: defaultdict[str, list[Callable[[], None]]] = defaultdict(list)
+        self.lock = Lock()
+
+    def subscribe(self, kind: Kind, listener: Callable[[], None]) -> None:
+        self.listeners[kind].append(listener)
+
+    def unsubscribe(self, kind: Kind, listener: Callable[[], None]) -> None:
+        if listener in self.listeners[kind]:
+            self.listeners[kind].remove(listener)
+
+    def notify(self, kind: Kind) -> None:
+        for listener in list(self.listeners[kind]):
+            listener()
+
+    def replace(
+        self, kind: Kind, objects: dict[str, Any], host: Optional[str] = None
+    ) -> bool:
+        """Replaces the objects of a host, all of them if host is None.
+
+        Returns True if any object was added, removed or changed."""
+        # A new dict, readers iterating the old one are not affected
+        with self.lock:
+            old = getattr(self, kind)
+            merged = objects
+            if host is not None:
+                merged = {k: o for k, o in old.items() if host_of(o) != host}
+                merged.update(objects)
+                old = {k: o for k, o in old.items() if host_of(o) == host}
+            # A snapshot is expected to differ, it isn't a missed change
+            changed = (kind, host) not in self.stale and (
+                old.keys() != objects.keys()
+                or any(o.attrs != old[k].attrs for k, o in objects.items())
+            )
+            setattr(self, kind, merged)
+            self.stale.discard((kind, host))
+            if kind == "containers":
+                # Built aside, the interface never sees them half done
+                indexes = (defaultdict(set), defaultdict(set), defaultdict(set))
+                refs = {id: container_refs(c) for id, c in merged.items()}
+                for container_id, keys in refs.items():
+                    add_refs(indexes, container_id, keys)
+                self.refs = refs
+                (
+                    self.image_containers,
+                    self.network_containers,
+                    self.volume_containers,
+                ) = indexes
+        self.notify(kind)
+        return changed
+
+    def is_stale(self, kind: Kind) -> bool:
+        return any(k == kind for k, _ in self.stale)
+
+    def put(self, kind: Kind, obj: Any) -> None:
+        obj_key = key(obj)
+        with self.lock:
+            getattr(self, kind)[obj_key] = obj
+            if kind == "containers":
+                self.unindex(obj_key)
+                self.index(obj_key, obj)
+        self.notify(kind)
+
+    def remove(self, kind: Kind, obj_key: str) -> bool:
+        with self.lock:
+            removed = getattr(self, kind).pop(obj_key, None) is not None
+            if kind == "containers":
+                self.unindex(obj_key)
+        if removed:
+            self.notify(kind)
+        return removed
+
+    def indexes(self) -> tuple[defaultdict, defaultdict, defaultdict]:
+        return self.image_containers, self.network_containers, self.volume_containers
+
+    def index(self, container_key: str, container: Any) -> None:
+        refs = self.refs[container_key] = container_refs(container)
+        add_refs(self.indexes(), container_key, refs)
+
+    def unindex(self, container_key: str) -> None:
+        refs = self.refs.pop(container_key, None)
+        if refs is None:
+            return None
+        image, networks, volumes = refs
+        for index, keys in zip(self.indexes(), ((image,), networks, volumes)):
+            for ref in keys:
+                index[ref].discard(container_key)
+                if not index[ref]:
+                    del index[ref]
+
+    def image_users(self, image_key: str) -> int:
+        users = self.image_containers.get(image_key)
+        return len(users) if users else 0
+
+    def network_users(self, network_key: str) -> int:
+        users = self.network_containers.get(network_key)
+        return len(users) if users else 0
+
+    def volume_users(self, volume_key: str) -> int:
+        users = self.volume_containers.get(volume_key)
+        return len(users) if users else 0
+
+
+store = Store()
+
+
+class LogBuffer:
+    """Raw log lines with their timestamps, capped by line count and bytes."""
+
+    def __init__(
+        self,
+        max_lines: int = LOG_MAX_LINES,
+        max_bytes: int = LOG_MAX_BYTES,
+        name: str = "",
+    ):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.name = name
+        self.lines: deque[tuple[float, bytes]] = deque()
+        self.size = 0
+        self.last_timestamp = 0.0
+        # Number of the oldest line kept, lines are numbered from the first append
+        self.first_line = 0
+        # Built on the first search, then kept up to date on each append
+        self.index: Optional[LogIndex] = None
+        self.lock = Lock()
+
+    @property
+    def end(self) -> int:
+        return self.first_line + len(self.lines)
+
+    def append(self, timestamp: float, line: bytes) -> None:
+        with self.lock:
+            self.lines.append((timestamp, line))
+            self.size += len(line)
+            self.last_timestamp = max(self.last_timestamp, timestamp)
+            if self.index is not None:
+                self.index.add(line.decode("utf-8", errors="ignore"))
+            while len(self.lines) > self.max_lines or self.size > self.max_bytes:
+                self.size -= len(self.lines.popleft()[1])
+                self.first_line += 1
+            if self.index is not None:
+                self.index.trim(self.first_line)
+
+    def snapshot(self) -> list[tuple[float, bytes]]:
+        with self.lock:
+            return list(self.lines)
+
+    def last_lines(self) -> Counter:
+        """The lines at last_timestamp, a stream since then sends them again."""
+        lines: Counter = Counter()
+        with self.lock:
+            for timestamp, line in reversed(self.lines):
+                if timestamp < self.last_timestamp:
+                    break
+                lines[line] += 1
+        return lines
+
+    def search(
+        self, pattern: re.Pattern, start: int = 0, lower: bool = False
+    ) -> tuple[list[int], int]:
+        """Numbers of the lines from `start` matching the pattern and the number
+        of the next line to search."""
+        with self.lock:
+            if self.index is None:
+                self.index = LogIndex(self.first_line)
+                for _, line in self.lines:
+                    self.index.add(line.decode("utf-8", errors="ignore"))
+            start = max(start, self.first_line)
+            matches = self.index.search(pattern, start, lower)
+            # Sealed blocks can still hold a few evicted lines
+            return [n for n in matches if n >= self.first_line], self.end
+
+    def line(self, number: int) -> Optional[str]:
+        with self.lock:
+            if self.index is None or number < self.first_line:
+                return None
+            return self.index.line(number)
+
+
+class LogStore:
+    """Log buffers of the recently viewed containers."""
+
+    def __init__(
+        self,
+        max_lines: int = LOG_MAX_LINES,
+        max_bytes: int = LOG_MAX_BYTES,
+        max_containers: int = LOG_MAX_CONTAINERS,
+    ):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.max_containers = max_containers
+        self.buffers: OrderedDict[str, LogBuffer] = OrderedDict()
+
+    def configure(self, max_lines: int, max_bytes: int) -> None:
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.buffers.clear()
+
+    def get(self, container_id: str, name: str = "") -> LogBuffer:
+        buffer = self.buffers.pop(container_id, None)
+        if buffer is None:
+            buffer = LogBuffer(self.max_lines, self.max_bytes, name)
+        self.buffers[container_id] = buffer
+        while len(self.buffers) > self.max_containers:
+            self.buffers.popitem(last=False)
+        return buffer
 
 
-store = Store(containers_images=[])
+log_store = LogStore()
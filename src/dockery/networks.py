@@ -1,3 +1,4 @@
+from functools import partial
 from textual.app import ComposeResult
 from textual.widgets import Static, Label
 from textual.reactive import reactive
@@ -6,37 +7,79 @@ from docker import DockerClient
 from docker.models.networks import Network
 
 from .custom_widgets import ResponsiveGrid
-from .utils import daemon
+from .utils import background, executor
+from .models import store
+from .events import apply_event
+from .hosts import Host, display_name, key, keyed
 
 
 class NetworkList(ResponsiveGrid):
-    networks_count = reactive(0)
+    networks_count = reactive(0, always_update=True)
+    # Bumped when the containers change, the networks in use may be others
+    usage_version = reactive(0, always_update=True)
 
-    def __init__(self, docker: DockerClient, **kargs):
-        self.networks = []
-        self.docker = docker
+    def __init__(self, hosts: list[Host], **kargs):
+        self.hosts = hosts
         super().__init__(**kargs)
 
+    @property
+    def networks(self) -> dict[str, Network]:
+        return store.networks
+
     def on_mount(self) -> None:
-        self.get_networks()
-        self.get_networks_timer = self.set_interval(2, self.get_networks, pause=True)
+        if self.networks:
+            self.networks_count = len(self.networks)
+        for host in self.hosts:
+            self.app.scheduler.add(
+                f"networks@{host.name}",
+                partial(self.get_networks, host),
+                group="networks",
+                host=host.name,
+            )
+        self.app.scheduler.run_group("networks")
+        self.app.docker_events.subscribe("network", self.on_network_event)
+        store.subscribe("containers", self.on_containers_change)
 
     async def watch_networks_count(self, count: int) -> None:
-        await self.grid.remove_children()
-        for c in self.networks:
-            cw = NetworkWidget(c, self.docker, classes="li")  # type: ignore
-            self.grid.mount(cw)
-
-    @daemon
-    def get_networks(self) -> None:
-        self.networks = self.docker.networks.list()
+        self.set_class(store.is_stale("networks"), "stale")
+        await self.update_items(
+            self.networks, lambda c: NetworkWidget(c, c.client, classes="li")
+        )
+
+    @background
+    def get_networks(self, host: Host) -> bool:
+        networks: list[Network] = host.client.networks.list()  # type: ignore
+        changed = store.replace("networks", keyed(networks, host.tag), host.tag)
         self.networks_count = len(self.networks)
+        return changed
+
+    def on_network_event(self, host: Host, event: dict) -> None:
+        if event.get("Action") not in ("create", "destroy"):
+            return None
+        if apply_event(
+            store, "networks", event, host.client.networks.get, host=host.tag
+        ):
+            self.networks_count = len(self.networks)
+
+    def on_containers_change(self) -> None:
+        self.usage_version += 1
+
+    async def watch_usage_version(self, version: int) -> None:
+        for widget in self.widgets.values():
+            if isinstance(widget, NetworkWidget) and widget.mounted:
+                widget.update_usage()
+
+    def on_unmount(self):
+        self.app.docker_events.unsubscribe("network", self.on_network_event)
+        store.unsubscribe("containers", self.on_containers_change)
+        self.app.scheduler.remove("networks")
+        executor.cancel(self)
 
     def on_hide(self):
-        self.get_networks_timer.pause()
+        self.app.scheduler.set_visible("networks", False)
 
     def on_show(self):
-        self.get_networks_timer.resume()
+        self.app.scheduler.set_visible("networks", True)
 
 
 class NetworkWidget(Static):
@@ -45,14 +88,25 @@ class NetworkWidget(Static):
         self.client = client
         self.attrs = network.attrs or {}
         self.isize = self.attrs.get("Size", 0) / 1000 / 1000
+        self.mounted = False
         super().__init__(**kargs)
 
     def compose(self) -> ComposeResult:
         yield Vertical(
-            Label("[b]" + (self.network.name or "")),
+            Label("[b]" + display_name(self.network)),
             Label(self.network.short_id),
             Horizontal(
                 Label("Scope: " + self.attrs.get("Scope", "-")),
                 Label(" Driver: " + self.attrs.get("Driver", "-")),
+                Label("", classes="usage"),
             ),
         )
+
+    def on_mount(self) -> None:
+        self.mounted = True
+        self.update_usage()
+
+    def update_usage(self) -> None:
+        users = store.network_users(key(self.network))  # type: ignore
+        self.set_class(users > 0, "running")
+        self.query_one(".usage", Label).update(f" Containers: {users}")
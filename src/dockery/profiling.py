@@ -0,0 +1,244 @@
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+from urllib.parse import urlparse
+
+from docker import DockerClient
+
+if TYPE_CHECKING:
+    from cProfile import Profile
+
+# The path segment after these is a name or an ID, e.g. /containers/{id}/json
+RESOURCES = (
+    "containers",
+    "images",
+    "networks",
+    "volumes",
+    "configs",
+    "secrets",
+    "services",
+    "tasks",
+    "nodes",
+    "exec",
+    "plugins",
+)
+ENDPOINT = re.compile(
+    rf"^/({'|'.join(RESOURCES)})/"
+    r"(?!(?:json|create|prune|search|load|get)$)(.+?)((?:/[a-z]+)?)$"
+)
+# Rows of each table in the summary, the slowest first
+SUMMARY_ROWS = 20
+
+
+@lru_cache(maxsize=1024)
+def endpoint(url: str) -> str:
+    """/containers/{id}/json for http+docker://localhost/v1.41/containers/a1b2/json"""
+    path = re.sub(r"^/v[\d.]+/", "/", urlparse(url).path)
+    match = ENDPOINT.match(path)
+    if match is None:
+        return path
+    return f"/{match[1]}/{{id}}{match[3]}"
+
+
+def thread_group(name: str) -> str:
+    # "Thread-3 (stream_stats)" for plain threads, "dockery_2" in the pools
+    match = re.match(r"Thread-\d+ \((.+)\)$", name)
+    if match is not None:
+        return match[1]
+    return name.rsplit("_", 1)[0]
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    errors: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": round(self.total, 3),
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0,
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class Profiler:
+    """Docker API calls by endpoint, UI timings, threads and open streams.
+
+    Always recorded, it's a few microseconds per call. A streamed response
+    (stats, logs, events) counts as a call when its headers are received and
+    as an open stream until it's closed or read to the end."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.started = time.monotonic()
+        # By (host, "GET /containers/{id}/json")
+        self.api: dict[tuple[str, str], Timing] = {}
+        self.ui: dict[str, Timing] = {}
+        self.streams: weakref.WeakSet = weakref.WeakSet()
+        self.streams_opened = 0
+        self.peak_threads = threading.active_count()
+        self.cprofile: Optional["Profile"] = None
+        self.cprofile_path: Optional[str] = None
+
+    def instrument(self, client: DockerClient, host: str) -> None:
+        """Time every request made by the client."""
+        api = client.api
+        request = api.request
+
+        def timed_request(method: str, url: str, *args, **kargs) -> Any:
+            start = time.perf_counter()
+            error = True
+            try:
+                response = request(method, url, *args, **kargs)
+                error = response.status_code >= 400
+                if kargs.get("stream") and not error:
+                    with self.lock:
+                        self.streams.add(response)
+                        self.streams_opened += 1
+                return response
+            finally:
+                seconds = time.perf_counter() - start
+                self.record_api(host, f"{method} {endpoint(url)}", seconds, error)
+
+        api.request = timed_request  # type: ignore
+
+    def record_api(self, host: str, name: str, seconds: float, error: bool) -> None:
+        threads = threading.active_count()
+        with self.lock:
+            timing = self.api.get((host, name))
+            if timing is None:
+                timing = self.api[(host, name)] = Timing()
+            timing.add(seconds, error)
+            self.peak_threads = max(self.peak_threads, threads)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield None
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                timing = self.ui.get(name)
+                if timing is None:
+                    timing = self.ui[name] = Timing()
+                timing.add(seconds)
+
+    def open_streams(self) -> int:
+        with self.lock:
+            streams = list(self.streams)
+        return sum(1 for s in streams if not s.raw.closed)
+
+    def report(self) -> dict:
+        threads = Counter(thread_group(t.name) for t in threading.enumerate())
+        with self.lock:
+            self.peak_threads = max(self.peak_threads, sum(threads.values()))
+            api = [
+                {"host": host, "endpoint": name, **timing.as_dict()}
+                for (host, name), timing in self.api.items()
+            ]
+            ui = [
+                {"name": name, **timing.as_dict()} for name, timing in self.ui.items()
+            ]
+            peak, opened = self.peak_threads, self.streams_opened
+        return {
+            "seconds": round(time.monotonic() - self.started, 1),
+            "api": sorted(api, key=lambda r: r["total"], reverse=True),
+            "ui": sorted(ui, key=lambda r: r["total"], reverse=True),
+            "threads": {
+                "count": sum(threads.values()),
+                "peak": peak,
+                "groups": threads,
+            },
+            "streams": {"open": self.open_streams(), "opened": opened},
+        }
+
+    def start_cprofile(self, path: str) -> None:
+        """Profile the main thread until finish(), where it's saved to path."""
+        from cProfile import Profile
+
+        if self.cprofile is None:
+            self.cprofile = Profile()
+            self.cprofile.enable()
+        self.cprofile_path = path
+
+    def finish(self) -> None:
+        from rich.console import Console
+
+        console = Console(stderr=True)
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+            self.cprofile = None
+        for table in report_tables(self.report()):
+            console.print(table)
+        if self.cprofile_path is not None:
+            console.print(
+                f"Profile saved to {self.cprofile_path}, "
+                f"read it with: python -m pstats {self.cprofile_path}"
+            )
+
+
+def report_tables(report: dict) -> list:
+    from rich.table import Table
+
+    tables = []
+    hosts = {r["host"] for r in report["api"]}
+    timing_columns = ("Calls", "Total s", "Avg ms", "Max ms")
+    if report["api"]:
+        columns = ("Host", "Endpoint") if len(hosts) > 1 else ("Endpoint",)
+        table = Table(
+            *columns,
+            *timing_columns,
+            "Errors",
+            title=f"Docker API calls in {report['seconds']}s",
+        )
+        for row in report["api"][:SUMMARY_ROWS]:
+            names = [row["host"], row["endpoint"]][-len(columns) :]
+            table.add_row(*names, *timing_cells(row), str(row["errors"]))
+        tables.append(table)
+    if report["ui"]:
+        table = Table("Interface", *timing_columns)
+        for row in report["ui"][:SUMMARY_ROWS]:
+            table.add_row(row["name"], *timing_cells(row))
+        tables.append(table)
+    threads, streams = report["threads"], report["streams"]
+    table = Table("Threads", "", "Streams", "")
+    rows = [
+        ("now", threads["count"], "open", streams["open"]),
+        ("peak", threads["peak"], "opened", streams["opened"]),
+    ]
+    rows += [(name, count, "", "") for name, count in sorted(threads["groups"].items())]
+    for row in rows:
+        table.add_row(*map(str, row))
+    tables.append(table)
+    return tables
+
+
+def timing_cells(row: dict) -> list[str]:
+    return [
+        str(row["count"]),
+        f"{row['total']:.3f}",
+        f"{row['avg_ms']:.1f}",
+        f"{row['max_ms']:.1f}",
+    ]
+
+
+profiler = Profiler()
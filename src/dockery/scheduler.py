@@ -0,0 +1,145 @@
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Optional
+
+from .events import RESYNC_INTERVAL
+
+# A resync that found changes missed by the events is repeated sooner
+MIN_INTERVAL = 5.0
+MAX_INTERVAL = 120.0
+# Spend at most 1/20 of the time waiting for the daemon
+LATENCY_FACTOR = 20
+MAX_BACKOFF = 300.0
+# Weight of the last fetch in the average latency
+LATENCY_WEIGHT = 0.3
+
+
+@dataclass
+class PollTask:
+    name: str
+    # Starts the refresh and returns its future, with True if anything changed
+    fetch: Callable[[], Future]
+    # Shown and hidden together, a list has one task per host
+    group: str = ""
+    host: Optional[str] = None
+    interval: float = RESYNC_INTERVAL
+    visible: bool = False
+    latency: float = 0.0
+    errors: int = 0
+    due: float = 0.0
+    last: Optional[float] = None
+    in_flight: bool = False
+
+
+class Scheduler:
+    """Decides when each list is resynced with the daemon.
+
+    Hidden lists are not refreshed, they catch up when shown if their last
+    refresh is older than their interval. The interval shrinks while the
+    refreshes find changes, grows while they don't, never goes below a
+    multiple of the daemon latency and backs off exponentially on errors."""
+
+    def __init__(
+        self, on_error: Optional[Callable[[PollTask, BaseException], None]] = None
+    ):
+        self.tasks: dict[str, PollTask] = {}
+        self.lock = Lock()
+        # Called when a task starts failing, from the worker thread or from the
+        # one calling run() if the fetch was already done
+        self.on_error = on_error
+
+    def add(
+        self,
+        name: str,
+        fetch: Callable[[], Future],
+        group: str = "",
+        host: Optional[str] = None,
+    ) -> PollTask:
+        task = self.tasks[name] = PollTask(name, fetch, group or name, host)
+        return task
+
+    def remove(self, group: str) -> None:
+        for task in self.group(group):
+            self.tasks.pop(task.name, None)
+
+    def group(self, group: str) -> list[PollTask]:
+        return [t for t in list(self.tasks.values()) if t.group == group]
+
+    def set_visible(self, group: str, visible: bool) -> None:
+        for task in self.group(group):
+            task.visible = visible
+            if visible and (task.last is None or self.age(task) >= task.interval):
+                task.due = 0.0
+
+    def run_group(self, group: str) -> None:
+        for task in self.group(group):
+            self.run(task.name)
+
+    def age(self, task: PollTask) -> float:
+        return time.monotonic() - task.last if task.last is not None else 0.0
+
+    def tick(self) -> None:
+        now = time.monotonic()
+        for task in list(self.tasks.values()):
+            if task.visible and not task.in_flight and task.due <= now:
+                self.run(task.name)
+
+    def run(self, name: str) -> None:
+        """Refresh now, visible or not."""
+        task = self.tasks.get(name)
+        if task is None or task.in_flight:
+            return None
+        task.in_flight = True
+        start = time.monotonic()
+        future = task.fetch()
+        future.add_done_callback(lambda f: self.done(task, start, f))
+
+    def done(self, task: PollTask, start: float, future: Future) -> None:
+        now = time.monotonic()
+        with self.lock:
+            task.in_flight = False
+            if future.cancelled():
+                return None
+            latency = now - start
+            first = task.last is None
+            task.latency = (
+                latency
+                if first
+                else task.latency + LATENCY_WEIGHT * (latency - task.latency)
+            )
+            task.last = now
+            error = future.exception()
+            if error is not None:
+                task.errors += 1
+                task.interval = min(MAX_BACKOFF, RESYNC_INTERVAL * 2**task.errors)
+                if task.errors == 1 and self.on_error is not None:
+                    self.on_error(task, error)
+            else:
+                task.errors = 0
+                # The first load always finds everything new
+                changed = not first and bool(future.result())
+                task.interval = self.next_interval(task, changed)
+            task.due = now + task.interval
+
+    def next_interval(self, task: PollTask, changed: bool) -> float:
+        if changed:
+            interval = max(MIN_INTERVAL, task.interval / 2)
+        else:
+            interval = min(MAX_INTERVAL, task.interval * 1.5)
+        return max(interval, task.latency * LATENCY_FACTOR)
+
+    def cadence(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": t.name,
+                "interval": round(t.interval, 1),
+                "latency": round(t.latency, 3),
+                "errors": t.errors,
+                "visible": t.visible,
+                "next": round(max(0.0, t.due - now), 1) if t.visible else None,
+            }
+            for t in self.tasks.values()
+        ]
@@ -0,0 +1,218 @@
+import re
+from array import array
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Iterator, Optional
+
+# Lines joined in each searchable block of a LogIndex
+BLOCK_LINES = 1024
+# Above this many matches rescanning is faster than checking each match again
+REFINE_MAX_MATCHES = 1000
+
+
+def ignore_case(query: str) -> bool:
+    # Smart case: case insensitive unless the query has uppercase letters
+    return query == query.lower()
+
+
+def compile_query(query: str) -> Optional[re.Pattern]:
+    """`/regex` or a plain substring.
+
+    Case insensitive queries are matched against lowercased text instead of
+    using re.IGNORECASE, which is several times slower."""
+    if ignore_case(query):
+        query = query.lower()
+    if query.startswith("/"):
+        if len(query) == 1:
+            return None
+        try:
+            return re.compile(query[1:], re.MULTILINE)
+        except re.error:
+            return None
+    return re.compile(re.escape(query))
+
+
+def is_refinement(old_query: str, new_query: str) -> bool:
+    # Matches of new_query are a subset of the matches of old_query
+    return (
+        old_query != ""
+        and not old_query.startswith("/")
+        and not new_query.startswith("/")
+        and old_query in new_query
+    )
+
+
+def ignore_case_pattern(pattern: re.Pattern) -> re.Pattern:
+    # Cached by re, compiled only once per query
+    return re.compile(pattern.pattern, pattern.flags | re.IGNORECASE)
+
+
+def line_end(text: str, offsets: array, index: int) -> int:
+    return offsets[index + 1] - 1 if index + 1 < len(offsets) else len(text)
+
+
+def search_lines(block: list, pattern: re.Pattern, start: int) -> list[int]:
+    """Numbers of the lines of a LogIndex block from `start` matching."""
+    first, text, offsets, _ = block
+    matches = []
+    for index in range(max(start - first, 0), len(offsets)):
+        if pattern.search(text[offsets[index] : line_end(text, offsets, index)]):
+            matches.append(first + index)
+    return matches
+
+
+class LogIndex:
+    """Text of the log lines kept in blocks joined with newlines.
+
+    Lines are added as they arrive and every BLOCK_LINES lines the block is
+    sealed into a single string, so a search is one regex scan per block in C
+    instead of a Python loop over the lines."""
+
+    def __init__(self, first_line: int = 0, block_lines: int = BLOCK_LINES):
+        self.block_lines = block_lines
+        # [first line number, lines joined with "\n", offset of each line,
+        # lowercased text once a case insensitive search needs it, False if
+        # lower() changed its length]
+        self.blocks: deque[list] = deque()
+        self.tail: list[str] = []
+        self.tail_first = first_line
+
+    @property
+    def end(self) -> int:
+        return self.tail_first + len(self.tail)
+
+    def add(self, line: str) -> None:
+        self.tail.append(line)
+        if len(self.tail) >= self.block_lines:
+            self.seal()
+
+    def seal(self) -> None:
+        offsets = array("q")
+        position = 0
+        for line in self.tail:
+            offsets.append(position)
+            position += len(line) + 1
+        self.blocks.append([self.tail_first, "\n".join(self.tail), offsets, None])
+        self.tail_first += len(self.tail)
+        self.tail = []
+
+    def trim(self, first_line: int) -> None:
+        # Drop the blocks that left the ring buffer
+        while self.blocks and self.blocks[0][0] + len(self.blocks[0][2]) <= first_line:
+            self.blocks.popleft()
+
+    def line(self, number: int) -> Optional[str]:
+        if number >= self.tail_first:
+            index = number - self.tail_first
+            return self.tail[index] if index < len(self.tail) else None
+        for first, text, offsets, _ in self.blocks:
+            if first <= number < first + len(offsets):
+                index = number - first
+                start = offsets[index]
+                return text[start : line_end(text, offsets, index)]
+        return None
+
+    def search(
+        self, pattern: re.Pattern, start: int = 0, lower: bool = False
+    ) -> list[int]:
+        """Numbers of the lines from `start` matching the pattern."""
+        matches = []
+        for block in self.blocks:
+            first, text, offsets, lower_text = block
+            if first + len(offsets) <= start:
+                continue
+            if lower:
+                if lower_text is None:
+                    lower_text = text.lower()
+                    # Offsets only hold if lower() keeps the length
+                    if len(lower_text) != len(text):
+                        lower_text = False
+                    block[3] = lower_text
+                if lower_text is False:
+                    # Searched line by line instead, still case insensitive
+                    matches += search_lines(block, ignore_case_pattern(pattern), start)
+                    continue
+                text = lower_text
+            position = offsets[start - first] if start > first else 0
+            while True:
+                match = pattern.search(text, position)
+                if match is None:
+                    break
+                index = bisect_right(offsets, match.start()) - 1
+                # A regex can also match across the newlines of the block
+                # (e.g. \s), so the line is checked on its own
+                line = text[offsets[index] : line_end(text, offsets, index)]
+                if pattern.search(line):
+                    matches.append(first + index)
+                if index + 1 >= len(offsets):
+                    break
+                # One match per line is enough, continue on the next one
+                position = offsets[index + 1]
+        for index, line in enumerate(self.tail):
+            number = self.tail_first + index
+            if number >= start and pattern.search(line.lower() if lower else line):
+                matches.append(number)
+        return matches
+
+
+class LogSearch:
+    """Matches of a query in several log buffers, updated as lines arrive.
+
+    Each buffer is only searched from the first line not searched yet and a
+    query extending the previous one only checks the previous matches."""
+
+    def __init__(self):
+        self.query = ""
+        self.lower = False
+        self.pattern: Optional[re.Pattern] = None
+        self.matches: dict[Any, list[int]] = {}
+        self.searched: dict[Any, int] = {}
+
+    @property
+    def count(self) -> int:
+        return sum(len(m) for m in self.matches.values())
+
+    def set_query(self, query: str, buffers: list) -> None:
+        pattern = compile_query(query) if query else None
+        refine = pattern is not None and is_refinement(self.query, query)
+        matches, searched = self.matches, self.searched
+        self.query, self.pattern = query, pattern
+        self.lower = ignore_case(query)
+        self.matches, self.searched = {}, {}
+        if pattern is None:
+            return None
+        for buffer in buffers:
+            lines, start = [], 0
+            if (
+                refine
+                and buffer in matches
+                and len(matches[buffer]) <= REFINE_MAX_MATCHES
+            ):
+                for number in matches[buffer]:
+                    line = buffer.line(number)
+                    if line is not None and self.match(line):
+                        lines.append(number)
+                start = searched[buffer]
+            more, self.searched[buffer] = buffer.search(pattern, start, self.lower)
+            self.matches[buffer] = lines + more
+
+    def match(self, line: str) -> Optional[re.Match]:
+        return self.pattern.search(line.lower() if self.lower else line)  # type: ignore
+
+    def finditer(self, line: str) -> Iterator[re.Match]:
+        # On the line itself, lower() can change where the matches are
+        if self.lower:
+            return ignore_case_pattern(self.pattern).finditer(line)  # type: ignore
+        return self.pattern.finditer(line)  # type: ignore
+
+    def update(self, buffers: list) -> list[tuple[Any, int]]:
+        """Matches in the lines added since the last search."""
+        found: list[tuple[Any, int]] = []
+        if self.pattern is None:
+            return found
+        for buffer in buffers:
+            start = self.searched.get(buffer, 0)
+            more, self.searched[buffer] = buffer.search(self.pattern, start, self.lower)
+            self.matches.setdefault(buffer, []).extend(more)
+            found.extend((buffer, number) for number in more)
+        return found
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .models import Kind, Store
+from .hosts import Host, host_of, keyed
+
+SNAPSHOT_VERSION = 1
+KINDS: tuple[Kind, ...] = ("containers", "images", "networks", "volumes")
+
+
+def snapshot_dir() -> Path:
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache) / "dockery" / "snapshots"
+
+
+def snapshot_path(url: str) -> Path:
+    return snapshot_dir() / (hashlib.sha256(url.encode()).hexdigest()[:16] + ".json.gz")
+
+
+def pick(attrs: dict, *keys: str) -> dict:
+    return {k: attrs[k] for k in keys if k in attrs}
+
+
+def compact_container(attrs: dict) -> dict:
+    # Only what the lists and the indexes use, Config.Env can hold secrets
+    config = attrs.get("Config") or {}
+    networks = (attrs.get("NetworkSettings") or {}).get("Networks") or {}
+    state = attrs.get("State")
+    return {
+        **pick(attrs, "Id", "Name", "Image", "ImageID", "Created"),
+        "State": pick(state, "Status", "Running") if isinstance(state, dict) else state,
+        "Config": pick(config, "Image", "Labels", "Tty"),
+        "NetworkSettings": {
+            "Networks": {
+                name: pick(n, "NetworkID") for name, n in networks.items() if n
+            }
+        },
+        "Mounts": [
+            pick(m, "Type", "Name") for m in attrs.get("Mounts") or [] if "Name" in m
+        ],
+    }
+
+
+COMPACT: dict[str, Callable[[dict], dict]] = {
+    "containers": compact_container,
+    "images": lambda a: pick(a, "Id", "RepoTags", "Size", "Created"),
+    "networks": lambda a: pick(a, "Id", "Name", "Scope", "Driver"),
+    "volumes": lambda a: pick(a, "Name", "Mountpoint", "Scope", "Driver"),
+}
+
+
+def save_snapshot(host: Host, store: Store) -> None:
+    data: dict[str, Any] = {
+        "version": SNAPSHOT_VERSION,
+        "url": host.url,
+        "time": time.time(),
+    }
+    for kind in KINDS:
+        objects = [o for o in getattr(store, kind).values() if host_of(o) == host.tag]
+        data[kind] = [COMPACT[kind](o.attrs or {}) for o in objects]
+    path = snapshot_path(host.url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    # Names and labels of the containers, only readable by the user
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, "wb") as raw, gzip.open(raw, "wt", compresslevel=6) as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_snapshot(host: Host, store: Store) -> Optional[float]:
+    """Fills the store with the last objects seen on this server, marked as
+    stale until the lists replace them. Returns the time of the snapshot."""
+    try:
+        with gzip.open(snapshot_path(host.url), "rt") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != SNAPSHOT_VERSION or data.get("url") != host.url:
+        return None
+    for kind in KINDS:
+        collection = getattr(host.client, kind)
+        objects = [collection.prepare_model(attrs) for attrs in data.get(kind, [])]
+        store.replace(kind, keyed(objects, host.tag), host.tag)
+        store.stale.add((kind, host.tag))
+    return data.get("time")
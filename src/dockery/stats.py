@@ -0,0 +1,166 @@
+from threading import Condition, Lock
+from typing import Callable, Optional
+from docker import errors
+from docker.models.containers import Container
+from docker.types.daemon import CancellableStream
+
+from .models import StatsSample
+from .metrics import MetricsStore
+from .hosts import key
+from .utils import (
+    daemon,
+    get_blk_io,
+    get_cpu_usage,
+    get_mem_usage,
+    get_net_io,
+    open_stats_stream,
+    close_stream,
+)
+
+# Upper bound of stats streams (threads and sockets) open at the same time
+MAX_STREAMS = 16
+# Seconds before reopening a stream that ended, doubled while it fails
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+StatsHandler = Callable[[StatsSample], None]
+
+
+def parse_stats(stats: dict) -> StatsSample:
+    mem, mem_percent = get_mem_usage(stats)
+    net_rx, net_tx = get_net_io(stats)
+    blk_read, blk_write = get_blk_io(stats)
+    return StatsSample(
+        cpu=get_cpu_usage(stats),
+        mem=mem,
+        mem_percent=mem_percent,
+        net_rx=net_rx,
+        net_tx=net_tx,
+        blk_read=blk_read,
+        blk_write=blk_write,
+    )
+
+
+class StatsService:
+    def __init__(
+        self, max_streams: int = MAX_STREAMS, history: Optional[MetricsStore] = None
+    ):
+        self.max_streams = max_streams
+        # Every sample is also added to the history of its container
+        self.history = history
+        self.lock = Lock()
+        # Notified when subscribers are removed, to end the streams waiting to reopen
+        self.changed = Condition(self.lock)
+        self.subscribers: dict[str, list[StatsHandler]] = {}
+        self.containers: dict[str, Container] = {}
+        self.streams: set[str] = set()
+        self.open_streams: dict[str, CancellableStream] = {}
+        # Last response of each open stream
+        self.last: dict[str, dict] = {}
+
+    def subscribe(self, container: Container, handler: StatsHandler) -> None:
+        with self.lock:
+            handlers = self.subscribers.setdefault(container.id, [])  # type: ignore
+            if handler in handlers:
+                return None
+            handlers.append(handler)
+            self.containers[container.id] = container  # type: ignore
+            self._open_streams()
+
+    def unsubscribe(self, container_id: str, handler: StatsHandler) -> None:
+        stream = None
+        with self.lock:
+            handlers = self.subscribers.get(container_id, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if len(handlers) == 0:
+                self.subscribers.pop(container_id, None)
+                self.containers.pop(container_id, None)
+                self.last.pop(container_id, None)
+                stream = self.open_streams.pop(container_id, None)
+                self.changed.notify_all()
+        if stream is not None:
+            close_stream(stream)
+
+    def last_stats(self, container_id: str) -> Optional[dict]:
+        """Last response of the container's stats stream, None without one."""
+        with self.lock:
+            return self.last.get(container_id)
+
+    def stop(self) -> None:
+        with self.lock:
+            self.subscribers.clear()
+            self.containers.clear()
+            self.last.clear()
+            streams = list(self.open_streams.values())
+            self.open_streams.clear()
+            self.changed.notify_all()
+        for stream in streams:
+            close_stream(stream)
+
+    def _open_streams(self) -> None:
+        # Must be called holding self.lock
+        for container_id, container in self.containers.items():
+            if len(self.streams) >= self.max_streams:
+                break
+            if container_id not in self.streams:
+                self.streams.add(container_id)
+                self.stream_stats(container)
+
+    @daemon
+    def stream_stats(self, container: Container) -> None:
+        # A stream ends by itself on errors and when the container stops, it's
+        # reopened with a backoff until its subscribers are gone
+        delay = RETRY_DELAY
+        while True:
+            if self.read_stream(container):
+                delay = RETRY_DELAY
+            with self.lock:
+                self.last.pop(container.id, None)  # type: ignore
+                if self.changed.wait_for(
+                    lambda: container.id not in self.subscribers, delay
+                ):
+                    self.streams.discard(container.id)  # type: ignore
+                    self._open_streams()
+                    return None
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def read_stream(self, container: Container) -> bool:
+        """Sends the samples to the subscribers until the stream ends, True if
+        there was any."""
+        stream = None
+        received = False
+        try:
+            stream = open_stats_stream(container)
+            with self.lock:
+                subscribed = container.id in self.subscribers
+                if subscribed:
+                    self.open_streams[container.id] = stream  # type: ignore
+            if not subscribed:
+                close_stream(stream)
+                return False
+            for stat in stream:
+                with self.lock:
+                    handlers = list(self.subscribers.get(container.id, []))  # type: ignore
+                    if handlers:
+                        self.last[container.id] = stat  # type: ignore
+                if len(handlers) == 0:
+                    break
+                received = True
+                sample = parse_stats(stat)
+                if self.history is not None:
+                    self.history.record(key(container), sample)
+                for handler in handlers:
+                    handler(sample)
+        except (errors.DockerException, OSError):
+            pass
+        finally:
+            with self.lock:
+                ended = stream is not None and (
+                    self.open_streams.get(container.id) is stream  # type: ignore
+                )
+                if ended:
+                    self.open_streams.pop(container.id, None)  # type: ignore
+            if ended:
+                close_stream(stream)  # type: ignore
+        return received
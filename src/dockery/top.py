@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+from rich.markup import escape
+from textual.app import ComposeResult
+from textual.timer import Timer
+from textual.widgets import DataTable, Label, Static
+
+from .metrics import METRIC_NAMES
+from .fleet import METRICS, TOTALS, FleetSampler, FleetStats
+from .models import store
+from .profiling import profiler
+from .utils import background, executor, format_metric
+
+# Seconds between refreshes while the view is shown
+TOP_INTERVAL = 2.0
+# Stats requests in flight at the same time
+TOP_PARALLEL = 16
+TOP_ROWS = 50
+COLUMN_NAMES = {**METRIC_NAMES, "cpu": "CPU %", "mem_percent": "MEM %"}
+
+
+class TopView(Static):
+    """The running containers with the highest usage, of all the hosts."""
+
+    BINDINGS = [("s", "next_sort", "Sort")]
+
+    def __init__(self, **kargs):
+        self.fleet = FleetStats()
+        self.lock = Lock()
+        self.sort = "cpu"
+        self.pool = ThreadPoolExecutor(TOP_PARALLEL, thread_name_prefix="top")
+        self.sampler: Optional[FleetSampler] = None
+        self.shown = False
+        self.timer: Optional[Timer] = None
+        super().__init__(**kargs)
+
+    def compose(self) -> ComposeResult:
+        yield Label(id="top-totals")
+        yield DataTable(id="top-table", zebra_stripes=True)
+
+    def on_mount(self) -> None:
+        self.table = self.query_one(DataTable)
+        self.table.cursor_type = "row"
+        self.table.add_column("Container", key="name")
+        for metric in METRICS:
+            self.table.add_column(COLUMN_NAMES[metric], key=metric)
+        # The containers on the cards are read from their stats streams
+        self.sampler = FleetSampler(self.pool, self.app.stats_service)
+        self.timer = self.set_interval(TOP_INTERVAL, self.get_stats, pause=True)
+
+    @background
+    def get_stats(self) -> None:
+        running = [c for c in list(store.containers.values()) if c.status == "running"]
+        samples = self.sampler.fetch(running)  # type: ignore
+        if not self.shown:
+            # Hidden meanwhile, close the streams fetch() may have opened
+            self.sampler.stop()  # type: ignore
+        with self.lock:
+            self.fleet.update(samples)
+        # The table can only be changed from the UI thread
+        self.call_later(self.update_table)
+
+    def update_table(self) -> None:
+        with self.lock:
+            totals = self.fleet.totals()
+            rows = [self.fleet.row(i) for i in self.fleet.top(self.sort, TOP_ROWS)]
+        lines = [
+            f"[bright_black]Sorted by {COLUMN_NAMES[self.sort]}, "
+            "press s or click on a column to change it"
+        ]
+        for host, total in totals.items():
+            usage = "  ".join(
+                f"{METRIC_NAMES[m]} {format_metric(m, total[m])}" for m in TOTALS
+            )
+            name = escape(host) if host is not None else "Total"
+            lines.append(f"[bold]{name}[/]: {total['containers']} running  {usage}")
+        self.query_one("#top-totals", Label).update("\n".join(lines))
+        with profiler.timed("top update"):
+            self.table.clear()
+            for row in rows:
+                self.table.add_row(
+                    row["name"], *(format_metric(m, row[m]) for m in METRICS)
+                )
+
+    def action_next_sort(self) -> None:
+        self.sort = METRICS[(METRICS.index(self.sort) + 1) % len(METRICS)]
+        self.update_table()
+
+    def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        if event.column_key.value in METRICS:
+            self.sort = event.column_key.value
+            self.update_table()
+
+    def on_show(self) -> None:
+        self.shown = True
+        if self.timer is not None:
+            self.timer.resume()
+        self.get_stats()
+
+    def on_hide(self) -> None:
+        self.shown = False
+        if self.timer is not None:
+            self.timer.pause()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def on_unmount(self) -> None:
+        executor.cancel(self)
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,11 +1,38 @@
+import calendar
 import json
-from threading import Thread
-from typing import Any, Literal
-from rich.console import Console
-from rich.syntax import Syntax
-import yaml
+import re
+import struct
+import sys
+import time
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, wraps
+from threading import Lock, Thread
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+)
 
-console = Console()
+from docker import errors
+from docker.utils import version_gte
+from docker.models.containers import Container
+from docker.types.daemon import CancellableStream
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+
+@lru_cache(maxsize=None)
+def get_console() -> "Console":
+    from rich.console import Console
+
+    return Console()
 
 
 def get_cpu_usage(stats: dict) -> float:
@@ -40,17 +67,335 @@ def get_mem_usage(stats: dict) -> tuple:
     return (mem_used / 1000000, percentage)
 
 
-def var_dump(obj: Any, syntax: Literal["json", "yaml"] = "yaml"):
+def get_net_io(stats: dict) -> tuple[int, int]:
+    # Bytes received and sent since the container started, all interfaces
+    networks = stats.get("networks") or {}
+    rx = sum(n.get("rx_bytes", 0) for n in networks.values())
+    tx = sum(n.get("tx_bytes", 0) for n in networks.values())
+    return (rx, tx)
+
+
+def get_blk_io(stats: dict) -> tuple[int, int]:
+    # cgroup v1 names the operations "Read"/"Write", v2 "read"/"write"
+    entries = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive")
+    read = write = 0
+    for entry in entries or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            read += entry.get("value", 0)
+        elif op == "write":
+            write += entry.get("value", 0)
+    return (read, write)
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.1f}{unit}"
+        size /= 1000
+    return f"{size:.1f}TB"
+
+
+def format_metric(metric: str, value: float) -> str:
+    # Percentages, memory in MB or I/O rates in bytes/s
+    if metric in ("cpu", "mem_percent"):
+        return f"{value:.1f}%"
+    if metric == "mem":
+        return format_size(value * 1000000)
+    return format_size(value) + "/s"
+
+
+@lru_cache(maxsize=16)
+def _parse_seconds(date: str) -> int:
+    return calendar.timegm(time.strptime(date, "%Y-%m-%dT%H:%M:%S"))
+
+
+def parse_timestamp(timestamp: str) -> float:
+    # Unix time of a docker RFC3339Nano timestamp, e.g. 2023-07-01T12:00:00.123456789Z
+    date, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = _parse_seconds(date)
+    return seconds + float("0." + fraction) if fraction else float(seconds)
+
+
+def parse_timestamp_ns(timestamp: str) -> int:
+    # Exact version of parse_timestamp, in nanoseconds
+    date, _, fraction = timestamp.rstrip("Z").partition(".")
+    return _parse_seconds(date) * 10**9 + int(fraction[:9].ljust(9, "0"))
+
+
+def format_timestamp(unix_time: float) -> str:
+    date = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(unix_time))
+    return f"{date}.{int(unix_time % 1 * 1e6):06d}Z"
+
+
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_time(value: str) -> float:
+    """Unix time of a timestamp, a date or a duration before now (1h30m), like
+    the --since and --until options of `docker logs`."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return time.time() - sum(float(n) * DURATION_UNITS[u] for n, u in parts)
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        pass
+    # Dates without a timezone are local time, raises ValueError if invalid
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def var_dump(obj: Any, syntax: Literal["json", "yaml", "ndjson"] = "yaml"):
+    if syntax == "ndjson":
+        # One object per line, written as soon as it's produced
+        for item in [obj] if isinstance(obj, dict) else obj:
+            sys.stdout.write(json.dumps(item, default=str) + "\n")
+            sys.stdout.flush()
+        return None
+    if not isinstance(obj, (dict, list)):
+        obj = list(obj)
     if syntax == "yaml":
+        import yaml
+
         text_obj = yaml.safe_dump(obj, indent=2)
     elif syntax == "json":
-        text_obj = json.dumps(obj, default=str, indent=2)
+        text_obj = json.dumps(obj, default=str, indent=2) + "\n"
+    if not sys.stdout.isatty():
+        # Highlighting is useless (and slow on big outputs) when piped
+        sys.stdout.write(text_obj)
+        return None
+    from rich.syntax import Syntax
+
     out = Syntax(text_obj, syntax, theme="ansi_dark")
-    console.print(out)
+    get_console().print(out)
+
+
+def open_stats_stream(container: Container) -> CancellableStream:
+    # container.stats(stream=True) returns a plain generator that can't be closed
+    api = container.client.api  # type: ignore
+    url = api._url("/containers/{0}/stats", container.id)
+    response = api._get(url, params={"stream": True}, stream=True)
+    return CancellableStream(api._stream_helper(response, decode=True), response)
+
+
+def has_one_shot(container: Container) -> bool:
+    # Older API versions ignore one-shot
+    return version_gte(container.client.api.api_version, "1.41")  # type: ignore
+
+
+def get_stats(container: Container) -> dict:
+    # Without one-shot (API 1.41+) the daemon waits a second for a 2nd sample
+    if has_one_shot(container):
+        return container.stats(stream=False, one_shot=True)  # type: ignore
+    return container.stats(stream=False)  # type: ignore
+
+
+# Bytes read from the socket at once when streaming logs
+LOGS_BLOCK_SIZE = 64 * 1024
+FRAME_HEADER = struct.Struct(">BxxxL")
+
+
+def demux_frames(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """stdout and stderr payloads of a multiplexed stream, joined per block."""
+    rest = b""
+    for block in blocks:
+        data = rest + block if rest else block
+        position = 0
+        payloads = []
+        while len(data) - position >= 8:
+            _, length = FRAME_HEADER.unpack_from(data, position)
+            end = position + 8 + length
+            if end > len(data):
+                break
+            payloads.append(data[position + 8 : end])
+            position = end
+        rest = data[position:]
+        if payloads:
+            yield b"".join(payloads)
+
+
+def stream_blocks(
+    container: Container, path: str, params: dict, follow: bool, demux: bool
+) -> Optional[CancellableStream]:
+    """Body of a streamed GET of a container API path, in blocks of up to
+    LOGS_BLOCK_SIZE bytes (the payloads of each block if `demux`). None if it
+    can't be followed that way.
+
+    docker-py has no public API for it, so this uses the private _url, _get
+    and socket helpers of its APIClient. When following, a block is returned
+    as soon as there's data with read1, which urllib3 only has from 2.1:
+    older ones wrap an http.client response that has it. Without read1 each
+    read would wait for a full block, so the response is closed and None
+    returned."""
+    api = container.client.api  # type: ignore
+    response = api._get(api._url(path, container.id), params=params, stream=True)
+    raw = response.raw
+    read = raw.read
+    if follow:
+        read = getattr(raw, "read1", None) or getattr(
+            getattr(raw, "_fp", None), "read1", None
+        )
+        if read is None:
+            # response.close() would leave the stream in a pooled connection
+            close_stream(CancellableStream(iter(()), response))
+            return None
+    # A followed stream can be quiet for a long time
+    api._disable_socket_timeout(api._get_raw_response_socket(response))
+    blocks: Iterator[bytes] = iter(lambda: read(LOGS_BLOCK_SIZE), b"")
+    if demux:
+        blocks = demux_frames(blocks)
+    return CancellableStream(blocks, response)
+
+
+def open_logs_stream(
+    container: Container, follow: bool = False, **params
+) -> CancellableStream:
+    """Raw log output in big blocks.
+
+    docker-py reads multiplexed logs with two reads per frame (one per line)
+    and tty logs byte by byte. Here the socket is read in LOGS_BLOCK_SIZE
+    blocks, or as soon as there's data when following."""
+    params = {k: v for k, v in params.items() if v is not None}
+    params["timestamps"] = int(params.get("timestamps", False))
+    params.setdefault("tail", "all")
+    options = dict(params, stdout=1, stderr=1, follow=int(follow))
+    demux = not container.attrs["Config"]["Tty"]
+    path = "/containers/{0}/logs"
+    stream = stream_blocks(container, path, options, follow, demux)
+    if stream is None:
+        # docker-py's reads, frame by frame
+        return container.logs(stream=True, follow=follow, **params)  # type: ignore
+    return stream
+
+
+# Bytes gathered before each write to stdout
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def write_stream(chunks: Iterable[bytes], live: bool = False) -> None:
+    """Raw chunks to stdout in large writes, or as they come if `live`."""
+    out = sys.stdout.buffer
+    pending: list[bytes] = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if live or size >= WRITE_BUFFER_SIZE:
+            out.write(b"".join(pending))
+            pending.clear()
+            size = 0
+            if live:
+                out.flush()
+    out.write(b"".join(pending))
+    out.flush()
+
+
+def close_stream(stream: CancellableStream) -> None:
+    # Closing the socket makes the thread reading the stream finish right away
+    try:
+        stream.close()
+    except errors.DockerException:
+        # SSH streams can't be cancelled, closing the response is the best we can do
+        stream._response.close()
 
 
 def daemon(func):
+    # A dedicated thread, only for long running streams (events, stats, logs)
     def wrapper_func(*args, **kwargs):
         Thread(target=func, args=args, kwargs=kwargs, daemon=True).start()
 
     return wrapper_func
+
+
+# Default number of threads for short background calls (list refreshes, etc.)
+MAX_WORKERS = 4
+
+
+class BackgroundExecutor:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.lock = Lock()
+        self.tasks: dict[Hashable, Future] = {}
+        self.running: set[Hashable] = set()
+        # Calls made while the same key was running, executed once after it
+        self.again: dict[Hashable, tuple] = {}
+
+    def set_max_workers(self, max_workers: int) -> None:
+        self.shutdown()
+        self.max_workers = max_workers
+
+    def shutdown(self) -> None:
+        """Let the threads end, the next call starts new ones."""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+
+    def submit(self, key: Hashable, func: Callable, *args, **kwargs) -> Future:
+        """Run func in the pool, unless a call with the same key is pending."""
+        with self.lock:
+            future = self.tasks.get(key)
+            if future is not None:
+                if key in self.running:
+                    self.again[key] = (func, args, kwargs)
+                return future
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="dockery"
+                )
+            future = self.pool.submit(self._run, key, func, args, kwargs)
+            self.tasks[key] = future
+            return future
+
+    def _run(self, key: Hashable, func: Callable, args: tuple, kwargs: dict) -> Any:
+        with self.lock:
+            self.running.add(key)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running.discard(key)
+                self.tasks.pop(key, None)
+                again = self.again.pop(key, None)
+            if again is not None:
+                self.submit(key, again[0], *again[1], **again[2])
+
+    def cancel(self, owner: Any) -> None:
+        """Cancel the queued calls of an object, running calls can't be stopped."""
+        with self.lock:
+            for key in list(self.tasks):
+                if isinstance(key, tuple) and key[0] == id(owner):
+                    self.again.pop(key, None)
+                    if self.tasks[key].cancel():
+                        self.tasks.pop(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": len(self.tasks) - len(self.running),
+                "in_flight": len(self.running),
+            }
+
+
+executor = BackgroundExecutor()
+
+
+def background(func):
+    """Run the method in the shared executor.
+
+    Calls are coalesced per instance, method and positional arguments, so only
+    one of them is in flight at a time and the calls made meanwhile run once
+    after it."""
+
+    @wraps(func)
+    def wrapper_func(self, *args, **kwargs):
+        key = (id(self), func.__name__, *args)
+        return executor.submit(key, func, self, *args, **kwargs)
+
+    return wrapper_func
@@ -1,3 +1,4 @@
+from functools import partial
 from textual.app import ComposeResult
 from textual.widgets import Static, Label
 from textual.reactive import reactive
@@ -6,38 +7,77 @@ from docker import DockerClient
 from docker.models.volumes import Volume
 
 from .custom_widgets import ResponsiveGrid
-from .utils import daemon
+from .utils import background, executor
+from .models import store
+from .events import apply_event
+from .hosts import Host, display_name, key, keyed
 
 
 class VolumesList(ResponsiveGrid):
-    volumes_count = reactive(0)
+    volumes_count = reactive(0, always_update=True)
+    # Bumped when the containers change, the volumes in use may be others
+    usage_version = reactive(0, always_update=True)
 
-    def __init__(self, docker: DockerClient, **kargs):
-        self.volumes: list[Volume] = []
-        self.docker = docker
-        
+    def __init__(self, hosts: list[Host], **kargs):
+        self.hosts = hosts
         super().__init__(**kargs)
 
+    @property
+    def volumes(self) -> dict[str, Volume]:
+        return store.volumes
+
     def on_mount(self) -> None:
-        self.get_volumes()
-        self.get_volumes_timer = self.set_interval(2, self.get_volumes, pause=True)
+        if self.volumes:
+            self.volumes_count = len(self.volumes)
+        for host in self.hosts:
+            self.app.scheduler.add(
+                f"volumes@{host.name}",
+                partial(self.get_volumes, host),
+                group="volumes",
+                host=host.name,
+            )
+        self.app.scheduler.run_group("volumes")
+        self.app.docker_events.subscribe("volume", self.on_volume_event)
+        store.subscribe("containers", self.on_containers_change)
 
     async def watch_volumes_count(self, count: int) -> None:
-        await self.grid.remove_children()
-        for c in self.volumes:
-            cw = VolumeWidget(c, self.docker, classes="li")
-            self.grid.mount(cw)
-
-    @daemon
-    def get_volumes(self) -> None:
-        self.volumes = self.docker.volumes.list()  # type: ignore
+        self.set_class(store.is_stale("volumes"), "stale")
+        await self.update_items(
+            self.volumes, lambda c: VolumeWidget(c, c.client, classes="li")
+        )
+
+    @background
+    def get_volumes(self, host: Host) -> bool:
+        volumes: list[Volume] = host.client.volumes.list()  # type: ignore
+        changed = store.replace("volumes", keyed(volumes, host.tag), host.tag)
         self.volumes_count = len(self.volumes)
+        return changed
+
+    def on_volume_event(self, host: Host, event: dict) -> None:
+        if event.get("Action") not in ("create", "destroy"):
+            return None
+        if apply_event(store, "volumes", event, host.client.volumes.get, host=host.tag):
+            self.volumes_count = len(self.volumes)
+
+    def on_containers_change(self) -> None:
+        self.usage_version += 1
+
+    async def watch_usage_version(self, version: int) -> None:
+        for widget in self.widgets.values():
+            if isinstance(widget, VolumeWidget) and widget.mounted:
+                widget.update_usage()
+
+    def on_unmount(self):
+        self.app.docker_events.unsubscribe("volume", self.on_volume_event)
+        store.unsubscribe("containers", self.on_containers_change)
+        self.app.scheduler.remove("volumes")
+        executor.cancel(self)
 
     def on_hide(self):
-        self.get_volumes_timer.pause()
+        self.app.scheduler.set_visible("volumes", False)
 
     def on_show(self):
-        self.get_volumes_timer.resume()
+        self.app.scheduler.set_visible("volumes", True)
 
 
 class VolumeWidget(Static):
@@ -46,14 +86,25 @@ class VolumeWidget(Static):
         self.client = client
         self.attrs = volume.attrs or {}
         self.isize = self.attrs.get("Size", 0) / 1000 / 1000
+        self.mounted = False
         super().__init__(**kargs)
 
     def compose(self) -> ComposeResult:
         yield Vertical(
-            Label("[b]" + self.volume.name),
+            Label("[b]" + display_name(self.volume)),
             Label(self.attrs.get("Mountpoint", "")),
             Horizontal(
                 Label("Scope: " + self.attrs.get("Scope", "-")),
                 Label(" Driver: " + self.attrs.get("Driver", "-")),
+                Label("", classes="usage"),
             ),
         )
+
+    def on_mount(self) -> None:
+        self.mounted = True
+        self.update_usage()
+
+    def update_usage(self) -> None:
+        users = store.volume_users(key(self.volume))  # type: ignore
+        self.set_class(users > 0, "running")
+        self.query_one(".usage", Label).update(f" Containers: {users}")
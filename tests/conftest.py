@@ -0,0 +1,52 @@
+import os
+import time
+from typing import Callable, Iterator
+
+import pytest
+from fake_docker import FakeDocker, serve
+
+from dockery.hosts import Host, connect
+from dockery.models import log_store, store
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+async def wait_for(pilot, condition: Callable[[], bool], timeout: float = 10) -> bool:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return True
+        await pilot.pause(0.05)
+    return condition()
+
+
+@pytest.fixture(autouse=True)
+def empty_stores() -> None:
+    # Global, and every fake daemon has the same container IDs
+    log_store.buffers.clear()
+    store.__init__()
+
+
+@pytest.fixture
+def fake_docker(tmp_path) -> Iterator[Callable[..., tuple[FakeDocker, Host]]]:
+    """Serves a FakeDocker made with the given arguments, returns it with a
+    Host connected to it."""
+    servers = []
+
+    def start(**kargs) -> tuple[FakeDocker, Host]:
+        path = os.path.join(tmp_path, f"docker{len(servers)}.sock")
+        fake = FakeDocker(**kargs)
+        servers.append(serve(path, fake))
+        (host,) = connect((f"unix://{path}",), None, False, "1.41", None)
+        return fake, host
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
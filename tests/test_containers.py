@@ -0,0 +1,29 @@
+import asyncio
+
+from dockery.containers import ContainersList
+from dockery.gui import AppGUI
+from dockery.models import store
+
+from conftest import wait_for
+
+
+def test_resync_only_inspects_changed_containers(fake_docker):
+    fake, host = fake_docker(containers=20)
+
+    async def main():
+        app = AppGUI([host], snapshot=False)
+        async with app.run_test(size=(160, 50)) as pilot:
+            containers = app.query_one(ContainersList)
+            assert await wait_for(pilot, lambda: len(store.containers) == 20)
+            with fake.lock:
+                fake.requests.clear()
+                changed = next(iter(fake.containers.values()))
+                changed["State"] = {"Status": "exited", "Running": False}
+            assert await asyncio.wrap_future(containers.get_containers(host))
+            # The stats streams of the cards may open meanwhile
+            requests = fake.requests_stats()["requests"]
+            assert requests["GET /containers/json"] == 1
+            assert requests["GET /containers/{id}/json"] == 1
+            assert store.containers[changed["Id"]].status == "exited"
+
+    asyncio.run(main())
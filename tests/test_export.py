@@ -0,0 +1,59 @@
+import signal
+import subprocess
+import time
+
+from export_check import dockery, exported_lines
+
+from conftest import wait_until
+
+# Far below the ~150000 lines/s of a first run here, only catches the line by
+# line writes
+MIN_LINES_PER_SECOND = 20000
+
+
+def export(host, directory) -> list[str]:
+    command = dockery("logs", "container0", "--export", str(directory))
+    return command + ["--server", host.url]
+
+
+def test_export_throughput(fake_docker, tmp_path):
+    _, host = fake_docker(containers=1, log_history=200000)
+    start = time.perf_counter()
+    subprocess.run(export(host, tmp_path), stdout=subprocess.DEVNULL, check=True)
+    seconds = time.perf_counter() - start
+    numbers = exported_lines(tmp_path / "container0")
+    assert numbers == list(range(len(numbers)))
+    assert len(numbers) >= 200000
+    assert len(numbers) / seconds > MIN_LINES_PER_SECOND
+
+
+def test_export_resumed(fake_docker, tmp_path):
+    _, host = fake_docker(containers=1, log_rate=50, log_history=1000)
+    folder = tmp_path / "container0"
+    subprocess.run(export(host, tmp_path), stdout=subprocess.DEVNULL, check=True)
+    first_run = len(exported_lines(folder))
+    time.sleep(0.5)
+    subprocess.run(export(host, tmp_path), stdout=subprocess.DEVNULL, check=True)
+    # Only the new lines are added, once and in order
+    numbers = exported_lines(folder)
+    assert len(numbers) > first_run >= 1000
+    assert numbers == list(range(len(numbers)))
+    assert not list(folder.glob("*.part"))
+
+
+def test_export_redone_after_kill(fake_docker, tmp_path):
+    _, host = fake_docker(containers=1, log_history=200000)
+    folder = tmp_path / "container0"
+    process = subprocess.Popen(export(host, tmp_path), stdout=subprocess.DEVNULL)
+    try:
+        assert wait_until(lambda: list(folder.glob("*.part")), 30)
+    finally:
+        process.send_signal(signal.SIGKILL)
+    # Killed mid-export
+    assert process.wait() == -signal.SIGKILL
+    subprocess.run(export(host, tmp_path), stdout=subprocess.DEVNULL, check=True)
+    # Every line once and in order, the lines of the killed run included
+    numbers = exported_lines(folder)
+    assert numbers == list(range(len(numbers)))
+    assert len(numbers) >= 200000
+    assert not list(folder.glob("*.part"))
@@ -0,0 +1,40 @@
+from pytest import approx
+
+from dockery.fleet import FleetStats
+
+
+def sample(fake, index: int, tick: int, second: int) -> dict:
+    stats = fake.stats(index, tick)
+    stats["read"] = f"2026-01-01T00:00:{second:02d}.000000000Z"
+    return stats
+
+
+def test_rates_from_the_previous_refresh(fake_docker):
+    fake, host = fake_docker(containers=2)
+    first, second = sorted(host.client.containers.list(), key=lambda c: c.name)
+    fleet = FleetStats()
+    fleet.update([(first, sample(fake, 0, 0, 0))])
+    assert fleet.row(0)["net_rx"] == 0
+    fleet.update([(second, sample(fake, 1, 0, 0)), (first, sample(fake, 0, 2, 2))])
+    rows = {fleet.row(i)["name"]: fleet.row(i) for i in range(len(fleet))}
+    # 2 * 4096 bytes in 2 seconds, 2% of the system time on 4 CPUs
+    assert rows["container0"]["net_rx"] == approx(4096)
+    assert rows["container0"]["cpu"] == approx(4.0)
+    # Nothing to compare a new container with
+    assert rows["container1"]["net_rx"] == 0
+    assert rows["container1"]["mem"] > rows["container0"]["mem"]
+    assert [fleet.row(i)["name"] for i in fleet.top("mem")] == [
+        "container1",
+        "container0",
+    ]
+    assert fleet.totals()[None]["containers"] == 2
+
+
+def test_counters_reset_by_a_restart(fake_docker):
+    fake, host = fake_docker(containers=1)
+    (container,) = host.client.containers.list()
+    fleet = FleetStats()
+    fleet.update([(container, sample(fake, 0, 5, 0))])
+    fleet.update([(container, sample(fake, 0, 0, 1))])
+    assert fleet.row(0)["net_rx"] == 0
+    assert fleet.row(0)["cpu"] == 0
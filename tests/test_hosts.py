@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from dockery.hosts import fetch_all, read_hosts_file
+
+
+def test_slow_host_reported_without_waiting_for_it(fake_docker):
+    _, fast = fake_docker(containers=1)
+    _, slow = fake_docker(containers=1, latency=2)
+    fast.timeout = slow.timeout = 0.3
+    start = time.monotonic()
+    results = list(fetch_all([fast, slow], lambda h: h.client.api.containers()))
+    assert time.monotonic() - start < 1
+    assert results[0][0] is fast and len(results[0][1]) == 1
+    assert results[1][0] is slow and isinstance(results[1][2], TimeoutError)
+
+
+def test_hosts_file_timeouts(tmp_path):
+    path = tmp_path / "hosts"
+    path.write_text(
+        "web1 ssh://web1 timeout=30\n"
+        "tcp://10.0.0.3:2375  # comment\n"
+        "unix:///var/run/docker.sock timeout=2.5\n"
+    )
+    assert read_hosts_file(str(path)) == [
+        ("web1", "ssh://web1", 30.0),
+        (None, "tcp://10.0.0.3:2375", None),
+        (None, "unix:///var/run/docker.sock", 2.5),
+    ]
+    path.write_text("web1 ssh://web1 timeout=soon\n")
+    with pytest.raises(ValueError):
+        read_hosts_file(str(path))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from conftest import wait_for
+from fake_docker import FakeDocker
+
+from dockery.actions import action_runner
+from dockery.charts import MetricsScreen
+from dockery.containers import ContainersList, ContainerWidget
+from dockery.gui import AppGUI
+from dockery.logs import LogsContainer, MergedLogsContainer
+from dockery.models import store
+from dockery.top import TOP_PARALLEL, TopView
+from dockery.utils import executor
+
+CONTAINERS = 6
+
+
+def counts(app, fake: FakeDocker) -> dict[str, int]:
+    # Idle keep-alive connections are closed first, how many are kept depends
+    # on how many requests ran at the same time
+    for host in app.hosts:
+        host.client.api.close()
+    return {
+        "streams": fake.open_streams,
+        "threads": threading.active_count(),
+        "open files": len(os.listdir("/proc/self/fd")),
+    }
+
+
+async def settled(app, pilot, fake: FakeDocker) -> dict[str, int]:
+    now = None
+    for _ in range(50):
+        await pilot.pause(0.2)
+        previous, now = now, counts(app, fake)
+        if now == previous:
+            break
+    return now  # type: ignore
+
+
+async def start_threads(submit: Callable[..., Future], workers: int) -> None:
+    # The pools start a thread per task until they are full, the baseline
+    # must not depend on how many tasks ran at the same time so far
+    barrier = threading.Barrier(workers)
+    futures = [submit(barrier.wait, 10) for _ in range(workers)]
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+
+def ignore(sample) -> None:
+    pass
+
+
+async def use(app, pilot) -> None:
+    containers = app.query_one(ContainersList)
+    nav = app.query_one("#nav")
+    for tab in ("top", "image-list", "network-list", "volume-list"):
+        nav.active = tab
+        await pilot.pause(0.2)
+    nav.active = "container-list"
+    # The cards subscribe again once the grid is shown
+    assert await wait_for(
+        pilot, lambda: len(app.stats_service.subscribers) == CONTAINERS
+    )
+    cards = list(containers.query(ContainerWidget))
+    app.push_screen(MetricsScreen(cards[0].container))
+    await pilot.pause(0.2)
+    app.pop_screen()
+    await pilot.pause(0.2)
+    # The logs of a container, then merged, opened and closed
+    view = app.query_one("#logs-view")
+    for logs in (
+        LogsContainer(cards[0].container),
+        MergedLogsContainer([c.container for c in cards[:3]]),
+    ):
+        await view.mount(logs)
+        await pilot.pause(0.2)
+        await view.remove_children()
+    # Stats of containers that are not on a card
+    for container in list(store.containers.values()):
+        app.stats_service.subscribe(container, ignore)
+    await pilot.pause(0.2)
+    for container in list(store.containers.values()):
+        app.stats_service.unsubscribe(container.id, ignore)
+
+
+def test_threads_streams_and_files_back_to_baseline(fake_docker):
+    fake, host = fake_docker(containers=CONTAINERS, stats_interval=0.1)
+
+    async def main():
+        app = AppGUI([host], snapshot=False)
+        async with app.run_test(size=(160, 50)) as pilot:
+            containers = app.query_one(ContainersList)
+            assert await wait_for(
+                pilot, lambda: len(containers.query(ContainerWidget)) == CONTAINERS
+            )
+            top: ThreadPoolExecutor = app.query_one(TopView).pool
+            # A new key for each call, the executor runs one call per key
+            await start_threads(
+                lambda *args: executor.submit(object(), *args), executor.max_workers
+            )
+            await start_threads(action_runner.pool.submit, action_runner.max_workers)
+            await start_threads(top.submit, TOP_PARALLEL)
+            await use(app, pilot)
+            baseline = await settled(app, pilot, fake)
+            for _ in range(3):
+                await use(app, pilot)
+            await wait_for(pilot, lambda: counts(app, fake) == baseline)
+            assert counts(app, fake) == baseline
+
+    asyncio.run(main())
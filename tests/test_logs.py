@@ -0,0 +1,20 @@
+from dockery.logs import LogsContainer
+
+SECOND = b"2026-01-01T00:00:01.000000000Z"
+
+
+def test_reopened_logs_keep_the_new_lines_at_the_last_timestamp(fake_docker):
+    _, host = fake_docker(containers=1)
+    (container,) = host.client.containers.list()
+    logs = LogsContainer(container)
+    logs.add_log_lines([b"2026-01-01T00:00:00.000000000Z start", SECOND + b" ping"])
+    after, seen = logs.buffer.last_timestamp, logs.buffer.last_lines()
+    # A stream since `after` sends the last line again, then the new ones
+    stream = [SECOND + b" ping", SECOND + b" ping", SECOND + b" pong"]
+    logs.add_log_lines(stream, after, seen)
+    assert [line for _, line in logs.buffer.snapshot()] == [
+        b"start",
+        b"ping",
+        b"ping",
+        b"pong",
+    ]
@@ -0,0 +1,30 @@
+from dockery.search import LogIndex, LogSearch, compile_query
+
+
+def index_of(lines: list[str], block_lines: int = 4) -> LogIndex:
+    index = LogIndex(block_lines=block_lines)
+    for line in lines:
+        index.add(line)
+    return index
+
+
+def test_regex_does_not_match_across_lines():
+    index = index_of(["abc", "def", "g h", "ijk", "lmn"])
+    # Only "g h" has a space, the newlines joining the block don't count
+    assert index.search(compile_query(r"/\s")) == [2]
+    assert index.search(compile_query(r"/c[^x]d")) == []
+    assert index.search(compile_query(r"/^i.*k$")) == [3]
+
+
+def test_case_insensitive_when_lower_changes_the_length():
+    lines = ["İx"] + [f"line {i} error" for i in range(7)]
+    index = index_of(lines)
+    assert index.search(compile_query("error"), lower=True) == list(range(1, 8))
+    assert index.search(compile_query("/ix"), lower=True) == [0]
+
+
+def test_highlights_on_the_original_line():
+    search = LogSearch()
+    search.set_query("error", [])
+    line = "İİ ERROR"
+    assert [(m.start(), m.end()) for m in search.finditer(line)] == [(3, 8)]
@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+import threading
+
+from dockery import stats
+from dockery.stats import StatsService
+
+from conftest import wait_until
+
+
+def stream_threads() -> int:
+    return sum("stream_stats" in t.name for t in threading.enumerate())
+
+
+def test_stream_reopened_when_it_ends(fake_docker, monkeypatch):
+    monkeypatch.setattr(stats, "RETRY_DELAY", 0.05)
+    fake, host = fake_docker(containers=1, stats_interval=0.01, stats_samples=3)
+    (container,) = host.client.containers.list()
+    service = StatsService()
+    samples = []
+    service.subscribe(container, samples.append)
+    # Three streams at least, the subscriber stays across them
+    assert wait_until(lambda: len(samples) >= 9)
+    assert container.id in service.subscribers
+    service.unsubscribe(container.id, samples.append)
+    assert wait_until(lambda: stream_threads() == 0 and fake.open_streams == 0)
+
+
+def test_stream_retried_while_it_fails(fake_docker, monkeypatch):
+    monkeypatch.setattr(stats, "RETRY_DELAY", 0.05)
+    fake, host = fake_docker(containers=1, stats_interval=0.01)
+    (container,) = host.client.containers.list()
+    service = StatsService()
+    samples = []
+    # Not found for a while
+    attrs = fake.containers.pop(container.id)
+    service.subscribe(container, samples.append)
+    assert not wait_until(lambda: samples, 0.3)
+    fake.containers[container.id] = attrs
+    assert wait_until(lambda: samples)
+    service.stop()
+    assert wait_until(lambda: stream_threads() == 0 and fake.open_streams == 0)
+
+
+def test_unsubscribe_ends_stream_waiting_to_reopen(fake_docker, monkeypatch):
+    monkeypatch.setattr(stats, "RETRY_DELAY", 60)
+    fake, host = fake_docker(containers=1, stats_interval=0.01, stats_samples=1)
+    (container,) = host.client.containers.list()
+    service = StatsService()
+    samples = []
+    service.subscribe(container, samples.append)
+    assert wait_until(lambda: samples and container.id not in service.open_streams)
+    service.unsubscribe(container.id, samples.append)
+    assert wait_until(lambda: stream_threads() == 0, 1)
+
+
+def test_watch_follows_started_and_stopped_containers(fake_docker):
+    fake, host = fake_docker(containers=1, stats_interval=0.01)
+    (first,) = fake.containers
+    command = [sys.executable, "-m", "dockery.main", "stats", "--server", host.url]
+    command += ["--watch", "--format", "json", "--interval", "0.05"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    ids: list[str] = []
+
+    def read():
+        for line in process.stdout:  # type: ignore
+            ids.append(json.loads(line)["id"])
+
+    threading.Thread(target=read, daemon=True).start()
+    try:
+        assert wait_until(lambda: first in ids)
+        started = fake.add_container(1, fake.containers[first]["Image"])
+        fake.emit({"Type": "container", "Action": "start", "Actor": {"ID": started}})
+        assert wait_until(lambda: started in ids)
+        fake.emit({"Type": "container", "Action": "die", "Actor": {"ID": first}})
+        # The events stream and the stream of the started container
+        assert wait_until(lambda: fake.open_streams == 2)
+        count = len(ids)
+        assert wait_until(lambda: ids[count:].count(started) >= 3)
+        assert first not in ids[count:]
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,36 @@
+import contextlib
+import http.client
+import threading
+
+import pytest
+import urllib3
+
+from dockery.utils import close_stream, open_logs_stream
+
+from conftest import wait_until
+
+
+@pytest.mark.parametrize("without", [(), ("urllib3",), ("urllib3", "http.client")])
+def test_followed_logs_come_as_they_are_written(fake_docker, monkeypatch, without):
+    # urllib3 before 2.1 has no read1, the http.client response under it has
+    if "urllib3" in without:
+        monkeypatch.setattr(urllib3.HTTPResponse, "read1", None)
+    if "http.client" in without:
+        monkeypatch.setattr(http.client.HTTPResponse, "read1", None)
+    _, host = fake_docker(containers=1, log_rate=20)
+    (container,) = host.client.containers.list()
+    stream = open_logs_stream(container, follow=True, tail=0)
+    data: list[bytes] = []
+
+    def read():
+        # Fails once the stream is closed under it
+        with contextlib.suppress(Exception):
+            for block in stream:
+                data.append(block)
+
+    threading.Thread(target=read, daemon=True).start()
+    try:
+        assert wait_until(lambda: b"".join(data).count(b"\n") >= 3, 5)
+    finally:
+        close_stream(stream)
+    assert b"".join(data).startswith(b"container0 line ")